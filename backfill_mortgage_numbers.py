@@ -0,0 +1,11 @@
+# backfill_mortgage_numbers.py
+import asyncio
+from schemas.mortgage_analytics import backfill_numeric_fields
+
+async def main():
+    print("🔢 Converting mortgage amounts, LTVs and renewal dates...")
+    result = await backfill_numeric_fields()
+    print(f"✅ Converted {result['converted']} applications; {result['unparsed_values']} values could not be parsed.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
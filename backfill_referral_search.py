@@ -0,0 +1,16 @@
+# backfill_referral_search.py
+import asyncio
+from config.database import users_collection
+from schemas.pagination import backfill_created_at
+from schemas.referral_search import backfill_referral_search_fields
+
+async def main():
+    print("🔎 Backfilling referral search fields...")
+    count = await backfill_referral_search_fields()
+    print(f"✅ Updated {count} referrals.")
+    # The user list pages on created_at too
+    count = await backfill_created_at(users_collection)
+    print(f"✅ Gave {count} users a created_at.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
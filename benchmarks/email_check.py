@@ -0,0 +1,167 @@
+"""End-to-end check of the email dispatcher against a local aiosmtpd server.
+
+Covers delivery over the pooled connections, and that a shutdown during
+backoff or in the middle of a batch parks every unsent message in the
+outbox, where replay_outbox picks it up again, and that replay drops stale
+messages and ones that have run out of attempts.
+
+    # needs `pip install aiosmtpd` (and mongomock-motor for --in-memory)
+    python -m benchmarks.email_check --in-memory
+    python -m benchmarks.email_check --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.http_bench import bind_database
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument("--mongo-url", help="mongod to run against")
+    backend.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--database", default="introducer_email_check", help="database for the outbox (dropped first)")
+    parser.add_argument("--messages", type=int, default=50, help="messages to send in the delivery check")
+    return parser.parse_args(argv)
+
+
+class Inbox:
+    """aiosmtpd handler that records recipients, optionally slowly."""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    bind_database(args)
+
+    from aiosmtpd.controller import Controller
+    import schemas.email_dispatcher as dispatcher_module
+    from schemas.email_dispatcher import EmailDispatcher, build_message
+    from config import database
+
+    await database.db_client.drop_database(args.database)
+    dispatcher_module.SMTP_HOST = "127.0.0.1"
+    dispatcher_module.SMTP_USE_TLS = False
+    dispatcher_module.EMAIL_SENDER = "noreply@example.com"
+    dispatcher_module.EMAIL_PASSWORD = None
+
+    def messages(count: int, tag: str):
+        return [build_message(f"{tag}{i}@example.com", "Verify your email", f"Code {i}") for i in range(count)]
+
+    async def outbox_count() -> int:
+        return await database.email_outbox_collection.count_documents({})
+
+    failures = []
+
+    def check(name: str, ok: bool, detail: str = ""):
+        print(f"{'PASS' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    # Delivery over persistent connections
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    dispatcher_module.SMTP_PORT = controller.port
+    dispatcher = EmailDispatcher(connections=2, batch_size=10, max_attempts=3)
+    for msg in messages(args.messages, "deliver"):
+        await dispatcher.enqueue(msg)
+    delivered = await wait_for(lambda: len(inbox.received) >= args.messages)
+    await dispatcher.stop()
+    check("delivery", delivered and dispatcher.sent == args.messages, f"{len(inbox.received)}/{args.messages} received")
+
+    # Shutdown while messages wait out their backoff
+    dispatcher_module.SMTP_PORT = free_port()  # nothing listening
+    dispatcher_module.EMAIL_BACKOFF_SECONDS = 30
+    dispatcher = EmailDispatcher(connections=1, batch_size=10, max_attempts=3)
+    for msg in messages(5, "backoff"):
+        await dispatcher.enqueue(msg)
+    await wait_for(lambda: dispatcher.stats()["retrying"] == 5)
+    await dispatcher.stop()
+    parked = await outbox_count()
+    check("stop during backoff", parked == 5, f"{parked}/5 in outbox")
+
+    # Shutdown part way through a batch
+    slow_inbox = Inbox(delay=0.2)
+    slow_controller = Controller(slow_inbox, hostname="127.0.0.1", port=free_port())
+    slow_controller.start()
+    dispatcher_module.SMTP_PORT = slow_controller.port
+    dispatcher = EmailDispatcher(connections=1, batch_size=10, max_attempts=3)
+    for msg in messages(10, "batch"):
+        await dispatcher.enqueue(msg)
+    await wait_for(lambda: len(slow_inbox.received) >= 2)
+    await dispatcher.stop()
+    slow_controller.stop()
+    accounted = len(slow_inbox.received) + await outbox_count() - parked
+    check("stop mid-batch", accounted >= 10, f"{len(slow_inbox.received)} received + {accounted - len(slow_inbox.received)} in outbox")
+
+    # Replay everything parked above
+    inbox.received.clear()
+    dispatcher_module.SMTP_PORT = controller.port
+    dispatcher = EmailDispatcher(connections=2, batch_size=10, max_attempts=3)
+    replayed = await dispatcher.replay_outbox()
+    await wait_for(lambda: len(inbox.received) >= replayed)
+    await dispatcher.stop()
+    check(
+        "replay outbox",
+        replayed == accounted - len(slow_inbox.received) + parked and len(inbox.received) == replayed,
+        f"{len(inbox.received)}/{replayed} resent",
+    )
+    controller.stop()
+
+    # Stale and dead messages are dropped; the rest keep their attempt count
+    now = datetime.utcnow()
+    parked_doc = {"subject": "Verify your email", "body": "Code", "last_error": "refused", "created_at": now}
+    await database.email_outbox_collection.insert_many([
+        {**parked_doc, "to": "stale@example.com", "attempts": 1, "queued_at": now - timedelta(hours=1)},
+        {**parked_doc, "to": "dead@example.com", "attempts": 4, "queued_at": now},
+        {**parked_doc, "to": "last-try@example.com", "attempts": 3, "queued_at": now},
+    ])
+    dispatcher_module.SMTP_PORT = free_port()  # nothing listening
+    dispatcher = EmailDispatcher(connections=1, batch_size=10, max_attempts=3)
+    replayed = await dispatcher.replay_outbox()
+    await wait_for(lambda: dispatcher.failed == 1)
+    await dispatcher.stop()
+    remaining = await database.email_outbox_collection.find({}, {"_id": 0, "to": 1, "attempts": 1}).to_list(None)
+    dispatcher = EmailDispatcher(connections=1, batch_size=10, max_attempts=3)
+    replayed_again = await dispatcher.replay_outbox()
+    await dispatcher.stop()
+    check(
+        "replay drops stale and dead",
+        replayed == 1 and remaining == [{"to": "last-try@example.com", "attempts": 4}] and replayed_again == 0,
+        f"{replayed} replayed, then {remaining}, then {replayed_again} replayed",
+    )
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
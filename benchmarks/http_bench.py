@@ -0,0 +1,247 @@
+"""HTTP benchmark for the hot endpoints.
+
+Drives the FastAPI ``app`` from main.py in-process through httpx and
+reports throughput and p50/p95/p99 latency per endpoint and concurrency.
+
+    # against a local mongod (uses a throwaway database)
+    python -m benchmarks.http_bench --mongo-url mongodb://localhost:27017 --referrals 100000
+
+    # against an in-memory stand-in (needs `pip install mongomock-motor`)
+    python -m benchmarks.http_bench --in-memory --referrals 10000
+
+    # record a baseline, then flag regressions against it later
+    python -m benchmarks.http_bench --in-memory --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.http_bench --in-memory --compare benchmarks/baselines/local.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+ENDPOINTS = ["token", "submit-referral", "my-referrals", "admin-users"]
+BENCH_PASSWORD = "bench-password"
+PURPOSES = ["Remortgage", "First time buyer", "Buy to let", "Home mover"]
+STATUSES = ["pending", "contacted", "in progress", "completed", "rejected"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument("--mongo-url", help="mongod to run against")
+    backend.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--database", default="introducer_bench", help="database to seed (dropped first)")
+    parser.add_argument("--users", type=int, default=1000, help="introducers to seed")
+    parser.add_argument("--referrals", type=int, default=10_000, help="referrals to seed")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma separated concurrency levels")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated subset of endpoints")
+    parser.add_argument("--save-baseline", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def bind_database(args):
+    """Point config.database at the benchmark database."""
+    import config.database as database
+
+    client = None
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    return database.connect(url=args.mongo_url, db_name=args.database, client=client)
+
+
+async def seed(args):
+    from config import database
+    from schemas.user_auth import hash_password
+
+    await database.db_client.drop_database(args.database)
+
+    # bcrypt once; every seeded user shares the hash
+    password_hash = await hash_password(BENCH_PASSWORD)
+    now = datetime.utcnow()
+    users = [{
+        "_id": str(uuid.uuid4()),
+        "name": f"Bench User {i}",
+        "email": f"bench{i}@example.com",
+        "contactnumber": "0000000000",
+        "referralId": f"BU{i:06d}",
+        "password": password_hash,
+        "role": "user",
+        "created_at": now,
+    } for i in range(args.users)]
+    await database.users_collection.insert_many(users)
+
+    chunk = 10_000
+    for start in range(0, args.referrals, chunk):
+        await database.referrals_collection.insert_many([{
+            "_id": str(uuid.uuid4()),
+            "firstName": f"Lead{i}",
+            "lastName": "Bench",
+            "referralPhone": None,
+            "referralEmail": f"lead{i}@example.com",
+            "purpose": PURPOSES[i % len(PURPOSES)],
+            "comment": None,
+            "referralId": users[i % args.users]["referralId"],
+            "status": STATUSES[i % len(STATUSES)],
+            "created_at": now,
+        } for i in range(start, min(start + chunk, args.referrals))])
+
+    if not args.in_memory:
+        from config.indexes import ensure_indexes
+        await ensure_indexes()
+
+    return users
+
+
+def auth_headers(users: list[dict]) -> dict:
+    from datetime import timedelta
+    from schemas.user_auth import create_access_token, ACCESS_TOKEN_EXPIRE_SECONDS
+
+    # One token per user, like a real client reusing its session
+    expires = timedelta(seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
+    return {
+        user["email"]: {"Authorization": "Bearer " + create_access_token(
+            {"sub": user["email"], "role": user["role"]}, expires
+        )}
+        for user in users
+    }
+
+
+def build_request(endpoint: str, users: list[dict], headers: dict, i: int):
+    user = users[i % len(users)]
+    auth = headers[user["email"]]
+    if endpoint == "token":
+        return "POST", "/token", {"data": {"username": user["email"], "password": BENCH_PASSWORD}}
+    if endpoint == "submit-referral":
+        return "POST", "/submit-referral", {"headers": auth, "json": {
+            "firstName": "Bench", "lastName": f"Lead{i}", "referralEmail": f"bench-lead{i}@example.com",
+            "purpose": PURPOSES[i % len(PURPOSES)],
+        }}
+    if endpoint == "my-referrals":
+        return "GET", "/my-referrals", {"headers": auth}
+    return "GET", "/admin/users", {}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+async def run_level(client, endpoint: str, users: list[dict], headers: dict, total: int, concurrency: int) -> dict:
+    requests = [build_request(endpoint, users, headers, i) for i in range(total)]
+    latencies, errors = [], 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            method, url, kwargs = requests[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if not before:
+            continue
+        label = f"{result['endpoint']} @ c={result['concurrency']}"
+        if result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{label}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return regressions
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    bind_database(args)
+
+    import httpx
+    import config.admission as admission
+    import schemas.rate_limit as rate_limit
+    from main import app
+
+    # Measure the endpoints themselves, not the auth throttle or load shedding
+    for rule in rate_limit.RATE_LIMITS.values():
+        for kind, (_, window) in rule.items():
+            rule[kind] = (10 ** 9, window)
+    admission.ADMISSION_CONTROL = False
+
+    print(f"Seeding {args.users} users and {args.referrals} referrals...")
+    users = await seed(args)
+    headers = auth_headers(users)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for endpoint in args.endpoints.split(","):
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                result = await run_level(client, endpoint, users, headers, args.requests, concurrency)
+                results.append(result)
+                print(
+                    f"{endpoint:16} c={concurrency:<4} {result['throughput_rps']:>9} req/s  "
+                    f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  "
+                    f"p99 {result['p99_ms']:>8}ms  errors {result['errors']}"
+                )
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "backend": "in-memory" if args.in_memory else "mongod",
+        "users": args.users,
+        "referrals": args.referrals,
+        "results": results,
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+
+from fastapi.responses import ORJSONResponse
+from prometheus_client import Counter
+from config.settings import ADMISSION_CONTROL
+
+# route class -> (concurrent requests, waiting requests, max wait seconds)
+ADMISSION_LIMITS = {
+    "auth": (16, 64, 10.0),
+    "write": (32, 128, 5.0),
+    "read": (64, 256, 2.0),
+    "admin": (4, 16, 10.0),
+    # Streams hold their slot for the whole download, so keep them apart from
+    # the admin pages and let only a couple run at once
+    "export": (2, 4, 30.0),
+}
+
+AUTH_PATHS = {"/register", "/resend-code", "/verify-code", "/token", "/token/refresh"}
+# Health checks, metrics and long-lived streams would only hold a slot
+EXEMPT_PATHS = {"/ready", "/metrics", "/docs", "/redoc", "/openapi.json", "/my-referrals/stream"}
+EXEMPT_PREFIXES = ("/admin/metrics/",)
+EXPORT_PREFIX = "/admin/export/"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+ADMISSION_REJECTED = Counter(
+    "app_admission_rejected_total",
+    "Requests turned away by admission control",
+    ["route_class", "reason"],
+)
+
+
+def route_class(method: str, path: str) -> str | None:
+    # Runs before routing, so classify on the raw path
+    if method in ("OPTIONS", "HEAD") or path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    if path.startswith(EXPORT_PREFIX):
+        return "export"
+    if path == "/admin" or path.startswith("/admin/"):
+        return "admin"
+    return "write" if method in WRITE_METHODS else "read"
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded wait queue for one route class.
+
+    Requests that would wait longer than ``max_wait`` (judged from the
+    queue length and recent service times) are refused up front instead
+    of timing out on the client after holding memory and a connection.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._slots = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long an admitted request holds its slot
+        self.service_seconds = 0.05
+
+    def predicted_wait(self) -> float:
+        if self.in_flight + self.queued < self.concurrency:
+            return 0.0
+        return (self.queued + 1) * self.service_seconds / self.concurrency
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        raise Overloaded(reason, retry_after)
+
+    async def acquire(self):
+        wait = self.predicted_wait()
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", wait)
+        if wait > self.max_wait:
+            self._reject("deadline", wait)
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._reject("timeout", self.predicted_wait())
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, held_seconds: float):
+        self.in_flight -= 1
+        self.service_seconds += 0.2 * (held_seconds - self.service_seconds)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "service_seconds_avg": round(self.service_seconds, 4),
+        }
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware giving each route class its own concurrency budget,
+    so slow logins or long admin exports can't starve cheap authenticated reads."""
+
+    def __init__(self, app, limiters: dict | None = None):
+        self.app = app
+        self.limiters = limiters if limiters is not None else admission_limiters
+
+    async def __call__(self, scope, receive, send):
+        kind = route_class(scope["method"], scope["path"]) if scope["type"] == "http" and ADMISSION_CONTROL else None
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[kind]
+        try:
+            await limiter.acquire()
+        except Overloaded as e:
+            response = ORJSONResponse(
+                {"detail": "Service is busy. Please try again shortly."},
+                status_code=503,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+
+admission_limiters = {name: AdmissionLimiter(name, *limits) for name, limits in ADMISSION_LIMITS.items()}
+
+
+def admission_stats() -> dict:
+    return {"enabled": ADMISSION_CONTROL, **{name: limiter.stats() for name, limiter in admission_limiters.items()}}
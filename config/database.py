@@ -1,18 +1,78 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import find_dotenv, load_dotenv
-import os
+from pymongo import ReadPreference
+from config.metrics import mongo_command_timer
+from config.settings import MONGO_URL, MONGO_DB_NAME, MONGO_CLIENT_OPTIONS
 
-dotenv_path = find_dotenv()
-load_dotenv(dotenv_path)
+db_client = None
+db = None
 
-MONGO_URL = os.getenv("MONGO_URL")
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
 
-db_client = AsyncIOMotorClient(MONGO_URL)
-db = db_client.mortgage
+def connect(url: str | None = None, db_name: str | None = None, client=None):
+    """Build the Mongo client. Called from the app lifespan; scripts such as
+    create_admin.py get it lazily on their first query instead."""
+    global db_client, db
+    if db is not None:
+        return db
+    db_client = client or AsyncIOMotorClient(
+        url or MONGO_URL, event_listeners=[mongo_command_timer], **MONGO_CLIENT_OPTIONS
+    )
+    db = db_client[db_name or MONGO_DB_NAME]
+    return db
 
-users_collection = db.users_collection
-referrals_collection = db.referrals_collection
-verification_collection = db.verification_collection
 
+def get_db():
+    return db if db is not None else connect()
+
+
+async def warm_up():
+    # Ping once to finish server selection; minPoolSize then fills the pool
+    # in the background so the first requests don't pay for connection setup
+    await get_db().command("ping")
+
+
+async def ping() -> bool:
+    try:
+        await get_db().command("ping")
+        return True
+    except Exception:
+        return False
+
+
+def close():
+    global db_client, db
+    if db_client is not None:
+        db_client.close()
+    db_client = None
+    db = None
+
+
+class CollectionProxy:
+    """Stands in for a collection until the client exists.
+
+    Modules import these at import time; the real collection is looked up
+    on each attribute access, so nothing connects until it is used.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def secondary_preferred(self):
+        # For admin reads that tolerate slightly stale data; not for listings
+        # served with a list_versions ETag, which is read from the primary
+        return get_db().get_collection(self.name, read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+users_collection = CollectionProxy("users_collection")
+referrals_collection = CollectionProxy("referrals_collection")
+verification_collection = CollectionProxy("verification_collection")
+email_outbox_collection = CollectionProxy("email_outbox_collection")
+referral_counters_collection = CollectionProxy("referral_counters_collection")
+referral_stats_collection = CollectionProxy("referral_stats")
+mortgage_applications_collection = CollectionProxy("mortgage_applications")
+rate_limits_collection = CollectionProxy("rate_limits")
+list_versions_collection = CollectionProxy("list_versions")
+referral_events_collection = CollectionProxy("referral_events")
+idempotency_keys_collection = CollectionProxy("idempotency_keys")
@@ -0,0 +1,83 @@
+import time
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from config.database import (
+    users_collection, referrals_collection, verification_collection, email_outbox_collection,
+    referral_stats_collection, mortgage_applications_collection, rate_limits_collection,
+    referral_events_collection, idempotency_keys_collection,
+)
+
+# Keep unverified sign-ups around for a while after the OTP expires so
+# /resend-code can still find them, then let Mongo clean them up.
+VERIFICATION_TTL_GRACE_SECONDS = 24 * 60 * 60
+
+INDEXES = [
+    (users_collection, IndexModel([("email", ASCENDING)], name="email_unique", unique=True)),
+    # Admin accounts all share referralId "ADMIN", so only introducers are unique
+    (users_collection, IndexModel(
+        [("referralId", ASCENDING)],
+        name="referralId_unique",
+        unique=True,
+        partialFilterExpression={"role": "user"},
+    )),
+    (referrals_collection, IndexModel([("referralId", ASCENDING), ("status", ASCENDING)], name="referralId_status")),
+    # Listings page newest first on (created_at, _id)
+    (users_collection, IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id")),
+    (referrals_collection, IndexModel(
+        [("referralId", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="referralId_created_at_id"
+    )),
+    # Admin search: each filter, then the (created_at, _id) sort/keyset order
+    (referrals_collection, IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id")),
+    (referrals_collection, IndexModel(
+        [("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="status_created_at_id"
+    )),
+    (referrals_collection, IndexModel(
+        [("purpose", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="purpose_created_at_id"
+    )),
+    # q: each $or branch is a prefix range on one of these. The sort on
+    # (created_at, _id) runs as a top-k sort bounded by the page size
+    (referrals_collection, IndexModel(
+        [("firstName_lc", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="firstName_lc_created_at_id"
+    )),
+    (referrals_collection, IndexModel(
+        [("lastName_lc", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="lastName_lc_created_at_id"
+    )),
+    (referrals_collection, IndexModel(
+        [("referralEmail_lc", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+        name="referralEmail_lc_created_at_id",
+    )),
+    (verification_collection, IndexModel(
+        [("expires_at", ASCENDING)],
+        name="expires_at_ttl",
+        expireAfterSeconds=VERIFICATION_TTL_GRACE_SECONDS,
+    )),
+    (email_outbox_collection, IndexModel([("created_at", ASCENDING)], name="created_at")),
+    (referral_stats_collection, IndexModel([("_id.referralId", ASCENDING)], name="referralId")),
+    (mortgage_applications_collection, IndexModel([("userId", ASCENDING), ("_id", ASCENDING)], name="userId_id")),
+    (mortgage_applications_collection, IndexModel([("kind", ASCENDING), ("_id", ASCENDING)], name="kind_id")),
+    (rate_limits_collection, IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)),
+    (idempotency_keys_collection, IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)),
+    # Status history of one referral, oldest first
+    (referral_events_collection, IndexModel([("referral", ASCENDING), ("_id", ASCENDING)], name="referral_id")),
+]
+
+
+async def ensure_indexes(indexes=INDEXES):
+    """Create any missing indexes. Safe to run on every startup."""
+    report = []
+    for collection, index in indexes:
+        started = time.perf_counter()
+        try:
+            await collection.create_indexes([index])
+            status, error = "ok", None
+        except PyMongoError as e:
+            # e.g. an existing index with the same name but different options
+            status, error = "error", str(e)
+        report.append({
+            "collection": collection.name,
+            "index": index.document["name"],
+            "status": status,
+            "error": error,
+            "seconds": round(time.perf_counter() - started, 4),
+        })
+    return report
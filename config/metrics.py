@@ -0,0 +1,108 @@
+import functools
+import logging
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+from config.settings import MONGO_SLOW_QUERY_MS
+
+logger = logging.getLogger("mongo.slow")
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection",
+    ["collection", "command", "outcome"],
+)
+MONGO_SLOW_COMMANDS = Counter(
+    "mongo_slow_commands_total",
+    "MongoDB commands slower than MONGO_SLOW_QUERY_MS",
+    ["collection", "command"],
+)
+OPERATION_LATENCY = Histogram(
+    "app_operation_duration_seconds",
+    "Latency of expensive application operations (bcrypt, SMTP)",
+    ["operation"],
+)
+IN_FLIGHT = Gauge("app_in_flight", "Queued or in-flight work by component", ["component", "state"])
+
+
+def timed(operation: str):
+    """Record how long an async function takes under ``operation``."""
+    histogram = OPERATION_LATENCY.labels(operation)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Times every command sent by the client it is registered on."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        # Most commands name their collection as the command value;
+        # getMore carries it in a separate field
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name, outcome).observe(seconds)
+        if seconds * 1000 >= MONGO_SLOW_QUERY_MS:
+            MONGO_SLOW_COMMANDS.labels(collection, event.command_name).inc()
+            logger.warning("Slow Mongo %s on %s: %.1fms", event.command_name, collection or "-", seconds * 1000)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class RequestTimingMiddleware:
+    """Pure ASGI middleware, so it adds no per-request task or body copy."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by route template (/admin/referrals/{referral_id}) to keep cardinality bounded
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+mongo_command_timer = MongoCommandTimer()
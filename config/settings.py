@@ -0,0 +1,73 @@
+import os
+
+from dotenv import find_dotenv, load_dotenv
+
+# The one place the .env file is read; every module takes its settings from here
+dotenv_path = find_dotenv()
+load_dotenv(dotenv_path)
+
+
+def env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+# Mongo
+MONGO_URL = os.getenv("MONGO_URL")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "mortgage")
+MONGO_CLIENT_OPTIONS = {
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000")),
+    # pymongo skips (with a warning) any compressor whose library isn't installed
+    "compressors": os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib"),
+}
+MONGO_SLOW_QUERY_MS = int(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+
+# Auth
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+# Counter values reserved per round trip and handed out from memory
+REFERRAL_ID_BLOCK_SIZE = int(os.getenv("REFERRAL_ID_BLOCK_SIZE", "20"))
+VERIFY_USE_TRANSACTION = env_flag("VERIFY_USE_TRANSACTION", "false")
+
+AUTH_POOL_KIND = os.getenv("AUTH_POOL_KIND", "thread")  # "thread" or "process"
+AUTH_POOL_WORKERS = int(os.getenv("AUTH_POOL_WORKERS", "4"))
+AUTH_POOL_MAX_QUEUE = int(os.getenv("AUTH_POOL_MAX_QUEUE", "64"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# "memory" for a single worker, "mongo" when several workers share the limits
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+TRUST_FORWARDED_FOR = env_flag("TRUST_FORWARDED_FOR", "false")
+
+ADMISSION_CONTROL = env_flag("ADMISSION_CONTROL", "true")
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# "auto" uses a change stream when the deployment supports one (replica set
+# or sharded cluster) and falls back to in-process pub/sub otherwise
+REFERRAL_FEED_BACKEND = os.getenv("REFERRAL_FEED_BACKEND", "auto")
+REFERRAL_FEED_HEARTBEAT_SECONDS = float(os.getenv("REFERRAL_FEED_HEARTBEAT_SECONDS", "15"))
+
+# Email. Hostinger SMTP config by default; point SMTP_HOST/SMTP_PORT at a
+# local aiosmtpd instance with SMTP_USE_TLS=false for testing.
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.hostinger.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_TLS = env_flag("SMTP_USE_TLS", "true")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+
+EMAIL_SENDER = os.getenv("email_address")
+EMAIL_PASSWORD = os.getenv("email_password")
+
+EMAIL_CONNECTIONS = int(os.getenv("EMAIL_CONNECTIONS", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_BACKOFF_SECONDS = float(os.getenv("EMAIL_BACKOFF_SECONDS", "1"))
+EMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "60"))
+# Verification codes expire after 5 minutes; older parked mail isn't worth sending
+EMAIL_OUTBOX_MAX_AGE_SECONDS = float(os.getenv("EMAIL_OUTBOX_MAX_AGE_SECONDS", "600"))
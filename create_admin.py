@@ -6,6 +6,7 @@ from passlib.context import CryptContext
 from datetime import datetime
 from config.database import users_collection
 from schemas.user_auth import hash_password
+from schemas.list_versions import bump_version, USERS_VERSION_KEY
 
 async def create_admin_user():
     print("🔐 Admin User Creation")
@@ -29,13 +30,14 @@ async def create_admin_user():
         "name": name,
         "email": email,
         "contactnumber": contactnumber,
-        "password": hash_password(password),
+        "password": await hash_password(password),
         "referralId": "ADMIN",
         "role": "admin",
         "created_at": datetime.utcnow(),
     }
 
     await users_collection.insert_one(user_data)
+    await bump_version(USERS_VERSION_KEY)
     print("✅ Admin user created successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+# import_introducers.py
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from pymongo.errors import BulkWriteError
+from config.database import users_collection
+from schemas.auth_pool import _hash
+from schemas.user_auth import allocate_referral_ids, referral_prefix
+from schemas.list_versions import bump_version, USERS_VERSION_KEY
+
+CHUNK_SIZE = 1000
+REFERRAL_ID_RETRIES = 5
+
+email_adapter = TypeAdapter(EmailStr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import introducer accounts from CSV or NDJSON.")
+    parser.add_argument("path", help="CSV with a header row, or NDJSON; fields name, email, contactnumber, password")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes used for bcrypt")
+    parser.add_argument("--checkpoint", help="progress file (default: <path>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start from the top")
+    parser.add_argument("--rejects", help="append rejected rows to this NDJSON file (default: <path>.rejects.ndjson)")
+    return parser.parse_args(argv)
+
+
+def read_rows(path: str, fmt: str):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_rows(path: str, fmt: str) -> int:
+    return sum(1 for _ in read_rows(path, fmt))
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"offset": 0, "created": 0, "skipped": 0, "rejected": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write then rename, so an interrupted run never leaves a torn file
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def clean_row(row: dict) -> tuple[dict | None, str | None]:
+    name = (row.get("name") or "").strip()
+    email = (row.get("email") or "").strip().lower()
+    # Passwords are taken exactly as given; spaces may be part of them
+    password = row.get("password") or ""
+    if not name or not email or not password:
+        return None, "name, email and password are required"
+    try:
+        email_adapter.validate_python(email)
+    except ValidationError:
+        return None, "invalid email"
+    return {"name": name, "email": email, "contactnumber": (row.get("contactnumber") or "").strip(), "password": password}, None
+
+
+async def assign_referral_ids(users: list[dict]):
+    # One counter round trip per prefix per chunk instead of one per user
+    by_prefix = defaultdict(list)
+    for user in users:
+        by_prefix[referral_prefix(user["name"])].append(user)
+    for prefix, group in by_prefix.items():
+        for user, referral_id in zip(group, await allocate_referral_ids(prefix, len(group))):
+            user["referralId"] = referral_id
+
+
+async def insert_users(users: list[dict]) -> tuple[int, int]:
+    """insert_many the chunk; returns (created, skipped as existing).
+
+    A referralId clash (with an ID from the old random allocator) gets a
+    fresh ID and another try; an email clash means someone registered or
+    an earlier run got there first.
+    """
+    created = skipped = 0
+    for _ in range(REFERRAL_ID_RETRIES):
+        if not users:
+            break
+        await assign_referral_ids(users)
+        try:
+            await users_collection.insert_many(users, ordered=False)
+            return created + len(users), skipped
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(err["code"] != 11000 for err in errors):
+                raise
+            retry = [err["index"] for err in errors if "referralId" in err.get("keyPattern", {})]
+            created += len(users) - len(errors)
+            skipped += len(errors) - len(retry)
+            users = [users[i] for i in retry]
+    if users:
+        raise RuntimeError(f"Could not allocate unique referral IDs for {len(users)} users.")
+    return created, skipped
+
+
+async def import_introducers(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    checkpoint_path = args.checkpoint or f"{args.path}.checkpoint"
+    rejects_path = args.rejects or f"{args.path}.rejects.ndjson"
+    checkpoint = {"offset": 0, "created": 0, "skipped": 0, "rejected": 0} if args.restart else load_checkpoint(checkpoint_path)
+
+    total = count_rows(args.path, fmt)
+    print(f"👥 Importing {total} introducers from {args.path}")
+    if checkpoint["offset"]:
+        print(f"↩️  Resuming after row {checkpoint['offset']}")
+
+    loop = asyncio.get_running_loop()
+    started, start_offset = time.perf_counter(), checkpoint["offset"]
+    rows = read_rows(args.path, fmt)
+    for _ in range(checkpoint["offset"]):
+        next(rows)
+
+    seen = set()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, open(rejects_path, "a") as rejects:
+        while True:
+            chunk = [row for _, row in zip(range(args.chunk_size), rows)]
+            if not chunk:
+                break
+
+            users = []
+            for offset, row in enumerate(chunk, start=checkpoint["offset"] + 1):
+                user, error = clean_row(row)
+                if user and user["email"] in seen:
+                    error = "duplicate email in file"
+                if error:
+                    checkpoint["rejected"] += 1
+                    rejects.write(json.dumps({"row": offset, "error": error, "email": row.get("email")}) + "\n")
+                    continue
+                seen.add(user["email"])
+                users.append(user)
+
+            # One $in query per chunk to drop emails that are already registered
+            existing = {
+                doc["email"]
+                async for doc in users_collection.find({"email": {"$in": [u["email"] for u in users]}}, {"email": 1})
+            }
+            checkpoint["skipped"] += sum(1 for u in users if u["email"] in existing)
+            users = [u for u in users if u["email"] not in existing]
+
+            hashes = await asyncio.gather(*(loop.run_in_executor(executor, _hash, u["password"]) for u in users))
+            now = datetime.utcnow()
+            for user, password_hash in zip(users, hashes):
+                user.update({"_id": str(uuid.uuid4()), "password": password_hash, "role": "user", "created_at": now})
+
+            created, skipped = await insert_users(users)
+            checkpoint["created"] += created
+            checkpoint["skipped"] += skipped
+            checkpoint["offset"] += len(chunk)
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            rate = (checkpoint["offset"] - start_offset) / max(time.perf_counter() - started, 1e-9)
+            print(
+                f"➡️  {checkpoint['offset']}/{total} rows, {checkpoint['created']} created, "
+                f"{checkpoint['skipped']} existing, {checkpoint['rejected']} rejected "
+                f"({rate:.0f} rows/s, ~{(total - checkpoint['offset']) / rate:.0f}s left)"
+            )
+
+    await bump_version(USERS_VERSION_KEY)
+    with contextlib.suppress(FileNotFoundError):
+        # No checkpoint if there were no rows to process
+        os.remove(checkpoint_path)
+    print(
+        f"✅ Import complete: {checkpoint['created']} created, {checkpoint['skipped']} already existed, "
+        f"{checkpoint['rejected']} rejected (see {rejects_path})."
+    )
+
+if __name__ == "__main__":
+    asyncio.run(import_introducers())
@@ -1,18 +1,70 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from routes import  user_auth, mortgage, referrals, admin
+from config import database
+from config.indexes import ensure_indexes
+from config.metrics import IN_FLIGHT, RequestTimingMiddleware
+from config.admission import AdmissionControlMiddleware, admission_limiters
+from schemas.auth_pool import auth_pool
+from schemas.email_dispatcher import email_dispatcher
+from schemas.referral_feed import referral_feed
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.connect()
+    await database.warm_up()
+    app.state.index_report = await ensure_indexes()
+    for result in app.state.index_report:
+        line = f"Index {result['collection']}.{result['index']}: {result['status']} in {result['seconds']}s"
+        print(line if not result["error"] else f"{line} ({result['error']})")
+    email_dispatcher.start()
+    await email_dispatcher.replay_outbox()
+    await referral_feed.start()
+    yield
+    await referral_feed.stop()
+    await email_dispatcher.stop()
+    auth_pool.shutdown()
+    database.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.include_router(user_auth.router)
 app.include_router(mortgage.router)
 app.include_router(referrals.router)
 app.include_router(admin.router)
 
+# Innermost, so CORS preflights skip it and 503s still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+app.add_middleware(RequestTimingMiddleware)
+
+# Sampled only when /metrics is scraped
+IN_FLIGHT.labels("auth_pool", "queued").set_function(lambda: auth_pool.stats()["queued"])
+IN_FLIGHT.labels("email", "queued").set_function(lambda: email_dispatcher.stats()["queued"])
+for name, limiter in admission_limiters.items():
+    IN_FLIGHT.labels(f"admission_{name}", "in_flight").set_function(lambda limiter=limiter: limiter.in_flight)
+    IN_FLIGHT.labels(f"admission_{name}", "queued").set_function(lambda limiter=limiter: limiter.queued)
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready(response: Response):
+    if not await database.ping():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unavailable"}
+    return {"status": "ready"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
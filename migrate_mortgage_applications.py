@@ -0,0 +1,63 @@
+# migrate_mortgage_applications.py
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config.database import users_collection, mortgage_applications_collection
+
+BATCH_SIZE = 500
+
+EMBEDDED_ARRAYS = {"mortgage_details": "existing", "new_mortgage_requests": "new"}
+
+
+def extract_applications(user: dict) -> list[dict]:
+    applications = []
+    for field, kind in EMBEDDED_ARRAYS.items():
+        for entry in user.get(field) or []:
+            application = dict(entry)
+            application.update({
+                "userId": user["_id"],
+                "kind": kind,
+                "created_at": application.get("created_at") or user.get("created_at") or datetime.utcnow(),
+            })
+            applications.append(application)
+    return applications
+
+
+async def migrate():
+    """Move embedded mortgage arrays into mortgage_applications.
+
+    Entries keep their original _id, so re-running after an interruption
+    skips whatever was already copied instead of duplicating it.
+    """
+    query = {"$or": [{field: {"$exists": True}} for field in EMBEDDED_ARRAYS]}
+    projection = {field: 1 for field in EMBEDDED_ARRAYS} | {"created_at": 1}
+    moved_users = moved_applications = 0
+
+    while True:
+        users = await users_collection.find(query, projection).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not users:
+            break
+
+        applications = [a for user in users for a in extract_applications(user)]
+        if applications:
+            try:
+                await mortgage_applications_collection.insert_many(applications, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys are entries copied by an earlier run
+                if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                    raise
+
+        await users_collection.bulk_write([
+            UpdateOne({"_id": user["_id"]}, {"$unset": {field: "" for field in EMBEDDED_ARRAYS}})
+            for user in users
+        ], ordered=False)
+
+        moved_users += len(users)
+        moved_applications += len(applications)
+        print(f"➡️  Moved {moved_applications} applications from {moved_users} users...")
+
+    print(f"✅ Migration complete: {moved_applications} applications from {moved_users} users.")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
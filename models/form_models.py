@@ -1,24 +1,88 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from pydantic import BaseModel, BeforeValidator, PlainSerializer
+from typing import Annotated, Optional
+from bson import Decimal128
+from models.page_models import MongoDocument
+
+
+def parse_number(value):
+    # Accepts what the forms used to send as text, e.g. "£250,000" or "75%"
+    if value is None or isinstance(value, (int, float, Decimal)):
+        return value
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    cleaned = str(value).replace("£", "").replace(",", "").replace("%", "").strip()
+    if not cleaned:
+        return None
+    try:
+        return Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"{value!r} is not a number")
+
+
+def parse_date(value):
+    if value is None or isinstance(value, date):
+        return value.date() if isinstance(value, datetime) else value
+    cleaned = str(value).strip()
+    if not cleaned:
+        return None
+    if "/" in cleaned:
+        return datetime.strptime(cleaned, "%d/%m/%Y").date()
+    # Renewal dates often only have a month
+    return date.fromisoformat(f"{cleaned}-01" if len(cleaned) == 7 else cleaned)
+
+
+def lenient(parser):
+    # For reading stored data: a legacy value that never parsed shouldn't
+    # break a whole listing
+    def parse(value):
+        try:
+            return parser(value)
+        except ValueError:
+            return None
+    return parse
+
+
+Money = Annotated[Optional[Decimal], BeforeValidator(parse_number)]
+Percentage = Annotated[Optional[Decimal], BeforeValidator(parse_number)]
+DateField = Annotated[Optional[date], BeforeValidator(parse_date)]
+
+# Decimal would otherwise go out as a JSON string
+StoredNumber = Annotated[
+    Optional[Decimal],
+    BeforeValidator(lenient(parse_number)),
+    PlainSerializer(float, return_type=float, when_used="json-unless-none"),
+]
+StoredDate = Annotated[Optional[date], BeforeValidator(lenient(parse_date))]
+
+
+def to_bson(value):
+    # Decimal128 keeps money exact; BSON has no date-only type
+    if isinstance(value, Decimal):
+        return Decimal128(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
 
 
 class MortgageDetails(BaseModel):
     hasMortgage: bool
     paymentMethod: Optional[str] = None
-    estPropertyValue: Optional[str] = None
-    mortgageAmount: Optional[str] = None
-    loanToValue1: Optional[str] = None
+    estPropertyValue: Money = None
+    mortgageAmount: Money = None
+    loanToValue1: Percentage = None
     furtherAdvance: Optional[str] = None
     mortgageType: Optional[str] = None
     productRateType: Optional[str] = None
-    renewalDate: Optional[str] = None
+    renewalDate: DateField = None
     isLookingForMortgage: Optional[bool] = None
     newMortgageType: Optional[str] = None
     foundProperty: Optional[str] = None
-    depositAmount: Optional[str] = None
-    purchasePrice: Optional[str] = None
-    loanToValue2: Optional[str] = None
-    loanAmount: Optional[str] = None
+    depositAmount: Money = None
+    purchasePrice: Money = None
+    loanToValue2: Percentage = None
+    loanAmount: Money = None
     sourceOfDeposit: Optional[str] = None
     loanTerm: Optional[str] = None
     newPaymentMethod: Optional[str] = None
@@ -29,13 +93,13 @@ class ExistingMortgageDetails(BaseModel):
     id: str
     hasMortgage: bool
     paymentMethod: Optional[str] = None
-    estPropertyValue: Optional[str] = None
-    mortgageAmount: Optional[str] = None
-    loanToValue1: Optional[str] = None
+    estPropertyValue: Money = None
+    mortgageAmount: Money = None
+    loanToValue1: Percentage = None
     furtherAdvance: Optional[str] = None
     mortgageType: Optional[str] = None
     productRateType: Optional[str] = None
-    renewalDate: Optional[str] = None
+    renewalDate: DateField = None
     reference1: Optional[str] = None
 
 
@@ -44,11 +108,47 @@ class NewMortgageRequest(BaseModel):
     isLookingForMortgage: bool
     newMortgageType: Optional[str] = None
     foundProperty: Optional[str] = None
-    depositAmount: Optional[str] = None
-    purchasePrice: Optional[str] = None
-    loanToValue2: Optional[str] = None
-    loanAmount: Optional[str] = None
+    depositAmount: Money = None
+    purchasePrice: Money = None
+    loanToValue2: Percentage = None
+    loanAmount: Money = None
     sourceOfDeposit: Optional[str] = None
     loanTerm: Optional[str] = None
     newPaymentMethod: Optional[str] = None
-    reference2: Optional[str] = None
\ No newline at end of file
+    reference2: Optional[str] = None
+
+
+class MortgageApplicationOut(MongoDocument):
+    userId: str
+    kind: str
+    hasMortgage: Optional[bool] = None
+    paymentMethod: Optional[str] = None
+    estPropertyValue: StoredNumber = None
+    mortgageAmount: StoredNumber = None
+    loanToValue1: StoredNumber = None
+    furtherAdvance: Optional[str] = None
+    mortgageType: Optional[str] = None
+    productRateType: Optional[str] = None
+    renewalDate: StoredDate = None
+    reference1: Optional[str] = None
+    isLookingForMortgage: Optional[bool] = None
+    newMortgageType: Optional[str] = None
+    foundProperty: Optional[str] = None
+    depositAmount: StoredNumber = None
+    purchasePrice: StoredNumber = None
+    loanToValue2: StoredNumber = None
+    loanAmount: StoredNumber = None
+    sourceOfDeposit: Optional[str] = None
+    loanTerm: Optional[str] = None
+    newPaymentMethod: Optional[str] = None
+    reference2: Optional[str] = None
+
+
+# Numeric and date fields, converted from the old free-text storage
+MONEY_FIELDS = ["estPropertyValue", "mortgageAmount", "depositAmount", "purchasePrice", "loanAmount"]
+PERCENTAGE_FIELDS = ["loanToValue1", "loanToValue2"]
+DATE_FIELDS = ["renewalDate"]
+
+# Fields stored for each kind of mortgage application
+EXISTING_MORTGAGE_FIELDS = [f for f in ExistingMortgageDetails.model_fields if f != "id"]
+NEW_MORTGAGE_FIELDS = [f for f in NewMortgageRequest.model_fields if f != "id"]
\ No newline at end of file
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Annotated, Generic, TypeVar
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+T = TypeVar("T")
+
+# Mongo ids are uuid strings, but older documents still carry ObjectIds
+ObjectIdStr = Annotated[str, BeforeValidator(str)]
+
+
+class MongoDocument(BaseModel):
+    # Built straight from Mongo documents, serialized back out as "_id"
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: ObjectIdStr = Field(alias="_id")
+    created_at: datetime | None = None
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+from models.page_models import MongoDocument
 
 class ReferralCreate(BaseModel):
     firstName: str
@@ -10,4 +11,27 @@ class ReferralCreate(BaseModel):
     comment: Optional[str] = None
 
 class StatusUpdate(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+class StatusChange(BaseModel):
+    id: str
+    status: str
+    # When set, the change only applies if the referral is still in this status
+    expected_status: Optional[str] = None
+
+class ReferralOut(MongoDocument):
+    # Everything optional, since list endpoints can narrow fields with ?fields=
+    firstName: Optional[str] = None
+    lastName: Optional[str] = None
+    referralPhone: Optional[str] = None
+    referralEmail: Optional[str] = None
+    purpose: Optional[str] = None
+    comment: Optional[str] = None
+    referralId: Optional[str] = None
+    status: Optional[str] = None
+
+# Fields returned by referral list endpoints
+REFERRAL_FIELDS = [
+    "firstName", "lastName", "referralPhone", "referralEmail",
+    "purpose", "comment", "referralId", "status", "created_at",
+]
\ No newline at end of file
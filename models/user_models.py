@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from models.page_models import MongoDocument
 
 
 class Token(BaseModel):
@@ -40,4 +41,17 @@ class UserUpdate(BaseModel):
     contactnumber: str | None = None
 
 class EmailOnlyRequest(BaseModel):
-    email: EmailStr
\ No newline at end of file
+    email: EmailStr
+
+
+class UserOut(MongoDocument):
+    # No password or mortgage data, ever
+    name: str | None = None
+    email: str | None = None
+    contactnumber: str | None = None
+    referralId: str | None = None
+    role: str | None = None
+
+
+# Fields returned by user list endpoints; never the password or mortgage arrays
+USER_LIST_FIELDS = ["name", "email", "contactnumber", "referralId", "role", "created_at"]
\ No newline at end of file
@@ -0,0 +1,11 @@
+# rebuild_referral_stats.py
+import asyncio
+from schemas.referral_stats import rebuild_referral_stats
+
+async def main():
+    print("📊 Rebuilding referral stats from referrals_collection...")
+    count = await rebuild_referral_stats()
+    print(f"✅ Rebuilt {count} referral stat counters.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
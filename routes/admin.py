@@ -1,38 +1,217 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Literal
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from config.database import users_collection, referrals_collection
-from models.referral_models import StatusUpdate
+from pymongo import ReturnDocument
+from config.admission import admission_stats
+from config.database import users_collection, referrals_collection, mortgage_applications_collection
+from models.referral_models import StatusUpdate, StatusChange, ReferralOut, REFERRAL_FIELDS
+from models.user_models import User, UserOut, USER_LIST_FIELDS
+from models.form_models import MortgageApplicationOut
+from models.page_models import Page
+from schemas.pagination import (
+    paginate, build_projection, created_between, NEWEST_FIRST, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+)
+from schemas.referral_stats import get_referral_stats
+from schemas.referral_status import (
+    apply_status_changes, record_transitions, status_update, PRE_IMAGE_PROJECTION, MAX_BULK_STATUS_CHANGES,
+)
+from schemas.user_auth import get_current_user
+from schemas.list_versions import (
+    list_etag, not_modified, referrals_version_key, USERS_VERSION_KEY,
+)
+from schemas.referral_feed import referral_feed
+from schemas.referral_search import build_referral_search, SORTS
+from schemas.export import stream_export, EXPORT_BATCH_SIZE, MEDIA_TYPES
+from schemas.auth_pool import auth_pool
+from schemas.email_dispatcher import email_dispatcher
+from schemas.mortgage_analytics import aggregate_portfolio, portfolio_statistics
 
 router = APIRouter(prefix="/admin")
 
-# Helper function to convert ObjectId to str
-def fix_id(doc):
-    doc["_id"] = str(doc["_id"])
-    return doc
+@router.get("/users", response_model=Page[UserOut])
+async def get_all_users(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    fields: str | None = None,
+):
+    etag = await list_etag(USERS_VERSION_KEY, limit, after, fields)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    # Versioned listings read from the primary, like the version itself;
+    # a lagging secondary would pin a stale page under the new ETag
+    return await paginate(
+        users_collection, {}, build_projection(fields, USER_LIST_FIELDS), limit, after, sort=NEWEST_FIRST
+    )
+
+
+@router.get("/referrals", response_model=Page[ReferralOut])
+async def search_referrals(
+    status: str | None = None,
+    purpose: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    q: str | None = Query(None, min_length=2, description="Prefix of first name, last name or email"),
+    sort: Literal["newest", "oldest"] = "newest",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    fields: str | None = None,
+):
+    return await paginate(
+        referrals_collection.secondary_preferred(),
+        build_referral_search(status, purpose, created_from, created_to, q),
+        build_projection(fields, REFERRAL_FIELDS),
+        limit,
+        after,
+        sort=SORTS[sort],
+    )
+
+
+@router.get("/referrals/{referral_id}", response_model=Page[ReferralOut])
+async def get_referrals_by_referral_id(
+    referral_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    fields: str | None = None,
+):
+    etag = await list_etag(referrals_version_key(referral_id), limit, after, fields)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    # Primary read, see get_all_users
+    return await paginate(
+        referrals_collection,
+        {"referralId": referral_id},
+        build_projection(fields, REFERRAL_FIELDS),
+        limit,
+        after,
+        sort=NEWEST_FIRST,
+    )
 
 
-@router.get("/users")
-async def get_all_users():
-    users_cursor = users_collection.find({})
-    users = [fix_id(user) async for user in users_cursor]
-    return users
+@router.get("/mortgages", response_model=Page[MortgageApplicationOut])
+async def get_mortgage_applications(
+    user_id: str | None = None,
+    kind: Literal["existing", "new"] | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+):
+    query = {}
+    if user_id:
+        query["userId"] = user_id
+    if kind:
+        query["kind"] = kind
+    return await paginate(mortgage_applications_collection.secondary_preferred(), query, None, limit, after)
 
 
-@router.get("/referrals/{referral_id}")
-async def get_referrals_by_referral_id(referral_id: str):
-    referrals_cursor = referrals_collection.find({"referralId": referral_id})
-    referrals = [fix_id(ref) async for ref in referrals_cursor]
-    return referrals
+@router.patch("/referrals/status")
+async def update_referral_statuses(
+    changes: list[StatusChange] = Body(..., max_length=MAX_BULK_STATUS_CHANGES),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        results = await apply_status_changes(changes, current_user.email)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    updated = sum(1 for result in results if result["status"] == "updated")
+    return {"updated": updated, "not_updated": len(results) - updated, "results": results}
 
 
 @router.patch("/referrals/{referral_id}/status")
-async def update_referral_status(referral_id: str, update: StatusUpdate):
-    result = await referrals_collection.update_one(
-        {"_id": referral_id},
-        {"$set": {"status": update.status}}
+async def update_referral_status(
+    referral_id: str,
+    update: StatusUpdate,
+    current_user: User = Depends(get_current_user),
+):
+    # The pre-image tells us which counter to decrement
+    event_id = ObjectId()
+    previous = await referrals_collection.find_one_and_update(
+        {"_id": referral_id, "status": {"$ne": update.status}},
+        status_update(update.status, event_id),
+        projection=PRE_IMAGE_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
     )
 
-    if result.modified_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Referral not found or already up to date")
 
-    return {"message": "Referral status updated successfully"}
\ No newline at end of file
+    await record_transitions([(event_id, previous, update.status)], current_user.email)
+
+    return {"message": "Referral status updated successfully"}
+
+
+def export_response(collection, query: dict, fields: list[str], fmt: str, compress: bool, name: str):
+    cursor = collection.secondary_preferred().find(query, {f: 1 for f in fields}, batch_size=EXPORT_BATCH_SIZE)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(stream_export(cursor, fields, fmt, compress), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/export/referrals")
+async def export_referrals(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    status: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    gzip: bool = False,
+):
+    query = build_referral_search(status, created_from=created_from, created_to=created_to)
+    return export_response(referrals_collection, query, ["_id"] + REFERRAL_FIELDS, fmt, gzip, "referrals")
+
+
+@router.get("/export/users")
+async def export_users(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    gzip: bool = False,
+):
+    query = created_between({}, created_from, created_to)
+    return export_response(users_collection, query, ["_id"] + USER_LIST_FIELDS, fmt, gzip, "users")
+
+
+@router.get("/stats")
+async def get_stats(referral_id: str | None = None):
+    return await get_referral_stats(referral_id)
+
+
+@router.get("/mortgage/analytics")
+async def get_mortgage_analytics():
+    try:
+        collection = mortgage_applications_collection.secondary_preferred()
+        portfolio = await aggregate_portfolio(collection)
+        portfolio["statistics"] = await portfolio_statistics(collection)
+        return portfolio
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing mortgage analytics: {str(e)}")
+
+
+@router.get("/metrics/auth-pool")
+async def get_auth_pool_metrics():
+    return auth_pool.stats()
+
+
+@router.get("/metrics/email")
+async def get_email_metrics():
+    return email_dispatcher.stats()
+
+
+@router.get("/metrics/referral-feed")
+async def get_referral_feed_metrics():
+    return referral_feed.stats()
+
+
+@router.get("/metrics/admission")
+async def get_admission_metrics():
+    return admission_stats()
\ No newline at end of file
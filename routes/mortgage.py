@@ -1,58 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 from bson import ObjectId
-from models.form_models import MortgageDetails
-from config.database import users_collection
+from models.form_models import (
+    MortgageDetails, MortgageApplicationOut, EXISTING_MORTGAGE_FIELDS, NEW_MORTGAGE_FIELDS, to_bson,
+)
+from models.page_models import Page
+from config.database import mortgage_applications_collection
 from schemas.user_auth import get_current_user
+from schemas.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from schemas.idempotency import run_idempotent
 from models.user_models import User
 
 router = APIRouter()
 
+
+def build_mortgage_application(data: MortgageDetails, user_id: str) -> dict:
+    # Existing mortgages and new mortgage requests share the collection,
+    # told apart by `kind` and only carrying their own fields
+    kind, fields = ("existing", EXISTING_MORTGAGE_FIELDS) if data.hasMortgage else ("new", NEW_MORTGAGE_FIELDS)
+    entry = {f: to_bson(getattr(data, f)) for f in fields}
+    entry.update({
+        "_id": ObjectId(),
+        "userId": user_id,
+        "kind": kind,
+        "created_at": datetime.utcnow(),
+    })
+    return entry
+
+
 @router.post("/add_mortgage_data/")
-async def add_mortgage_data(data: MortgageDetails, current_user: User=Depends(get_current_user)):
-    try:
-        user_doc = await users_collection.find_one({"username": current_user.userId})
-        
-        if data.hasMortgage:
-            entry = {
-                "_id": ObjectId(),
-                "hasMortgage": data.hasMortgage,
-                "paymentMethod": data.paymentMethod,
-                "estPropertyValue": data.estPropertyValue,
-                "mortgageAmount": data.mortgageAmount,
-                "loanToValue1": data.loanToValue1,
-                "furtherAdvance": data.furtherAdvance,
-                "mortgageType": data.mortgageType,
-                "productRateType": data.productRateType,
-                "renewalDate": data.renewalDate,
-                'reference1': data.reference1,
-            }
-            # Append to mortgage_details array
-            await users_collection.update_one(
-                {"username": data.username},
-                {"$push": {"mortgage_details": entry}}
-            )
-        else:
-            entry = {
-                "_id": ObjectId(),
-                "isLookingForMortgage": data.isLookingForMortgage,
-                "foundProperty": data.foundProperty,
-                "newMortgageType": data.newMortgageType,
-                "depositAmount": data.depositAmount,
-                "purchasePrice": data.purchasePrice,
-                "loanToValue2": data.loanToValue2,
-                "loanAmount": data.loanAmount,
-                "sourceOfDeposit": data.sourceOfDeposit,
-                "loanTerm": data.loanTerm,
-                "newPaymentMethod": data.newPaymentMethod,
-                'reference2': data.reference2
-            }
-            # Append to new_mortgage_requests array
-            await users_collection.update_one(
-                {"UserId": current_user.userId},
-                {"$push": {"new_mortgage_requests": entry}}
-            )
-        
-        return {"message": "Data added successfully"}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+async def add_mortgage_data(
+    data: MortgageDetails,
+    current_user: User=Depends(get_current_user),
+    idempotency_key: str | None = Header(None),
+):
+    async def add():
+        try:
+            await mortgage_applications_collection.insert_one(build_mortgage_application(data, current_user.userId))
+            return {"message": "Data added successfully"}
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return await run_idempotent(
+        idempotency_key, f"add_mortgage_data:{current_user.userId}", data.model_dump(mode="json"), add
+    )
+
+
+@router.get("/my-mortgages", response_model=Page[MortgageApplicationOut])
+async def get_my_mortgages(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    current_user: User = Depends(get_current_user),
+):
+    return await paginate(mortgage_applications_collection, {"userId": current_user.userId}, None, limit, after)
@@ -1,33 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections import Counter
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
 from models.user_models import User
-from models.referral_models import ReferralCreate
+from models.referral_models import ReferralCreate, ReferralOut, REFERRAL_FIELDS
+from models.page_models import Page
 from config.database import referrals_collection
 from uuid import uuid4
+from datetime import datetime
 from schemas.user_auth import get_current_user
+from schemas.referral_stats import record_referral_created, record_referrals_created
+from schemas.list_versions import bump_version, list_etag, not_modified, referrals_version_key
+from schemas.referral_feed import event_stream
+from schemas.referral_search import search_fields
+from schemas.idempotency import run_idempotent
+from schemas.pagination import paginate, build_projection, NEWEST_FIRST, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
+MAX_BATCH_REFERRALS = 1000
+
+
+def build_referral(referral: ReferralCreate, referral_id: str) -> dict:
+    referral_data = referral.model_dump()
+    referral_data.update({
+        "_id": str(uuid4()),
+        "referralId": referral_id,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    })
+    referral_data.update(search_fields(referral_data))
+    return referral_data
+
+
 @router.post("/submit-referral")
-async def submit_referral(referral: ReferralCreate, current_user: User = Depends(get_current_user)):
-    try:
-        referral_data = referral.dict()
-        print(referral_data)
-        referral_data.update({
-            "_id": str(uuid4()),
-            "referralId": current_user.referralId,
-            "status": "pending"
-        })
-        print(referral_data)
-        await referrals_collection.insert_one(referral_data)
+async def submit_referral(
+    referral: ReferralCreate,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: str | None = Header(None),
+):
+    async def submit():
+        try:
+            referral_data = build_referral(referral, current_user.referralId)
+            await referrals_collection.insert_one(referral_data)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+        # The referral exists now, so this must not fail the request: a 500
+        # would release the Idempotency-Key and the retry would insert it again
+        try:
+            # Bump first, so a failure in the bookkeeping can't leave pollers on a stale 304
+            await bump_version(referrals_version_key(current_user.referralId))
+            await record_referral_created(current_user.referralId, "pending", referral.purpose)
+        except Exception as e:
+            # rebuild_referral_stats.py repairs the counters
+            print(f"Bookkeeping failed for referral {referral_data['_id']}: {e}")
         return {"message": "Referral submitted successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+    # Client retries after a timeout replay the first response instead of inserting again
+    return await run_idempotent(
+        idempotency_key, f"submit-referral:{current_user.userId}", referral.model_dump(mode="json"), submit
+    )
+
+
+@router.post("/submit-referrals/batch")
+async def submit_referrals_batch(
+    items: list[dict] = Body(..., max_length=MAX_BATCH_REFERRALS),
+    current_user: User = Depends(get_current_user),
+):
+    # Validate item by item so one bad row doesn't reject the whole upload
+    results = [None] * len(items)
+    documents, positions = [], []
+    for index, item in enumerate(items):
+        try:
+            referral = ReferralCreate.model_validate(item)
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results[index] = {"index": index, "status": "error", "error": errors}
+            continue
+        documents.append(build_referral(referral, current_user.referralId))
+        positions.append(index)
 
-@router.get("/my-referrals")
-async def get_my_referrals(current_user: User = Depends(get_current_user)):
+    failed = {}
+    if documents:
+        try:
+            await referrals_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    created = Counter()
+    for doc_index, (doc, index) in enumerate(zip(documents, positions)):
+        if doc_index in failed:
+            results[index] = {"index": index, "status": "error", "error": failed[doc_index]}
+        else:
+            results[index] = {"index": index, "status": "created", "id": doc["_id"]}
+            created[doc["purpose"]] += 1
+
+    if created:
+        await bump_version(referrals_version_key(current_user.referralId))
+        await record_referrals_created(current_user.referralId, "pending", created)
+
+    return {
+        "created": sum(created.values()),
+        "failed": len(items) - sum(created.values()),
+        "results": results,
+    }
+
+
+@router.get("/my-referrals", response_model=Page[ReferralOut])
+async def get_my_referrals(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = None,
+    fields: str | None = None,
+    current_user: User = Depends(get_current_user),
+):
     try:
-        referrals = await referrals_collection.find({"referralId": current_user.referralId}).to_list(length=None)
-        return referrals
+        # Pollers with an up-to-date ETag get a 304 without touching referrals
+        etag = await list_etag(referrals_version_key(current_user.referralId), limit, after, fields)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response.headers["ETag"] = etag
+
+        return await paginate(
+            referrals_collection,
+            {"referralId": current_user.referralId},
+            build_projection(fields, REFERRAL_FIELDS),
+            limit,
+            after,
+            sort=NEWEST_FIRST,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching referrals: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching referrals: {str(e)}")
+
+
+@router.get("/my-referrals/stream")
+async def stream_my_referrals(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    last_event_id: str | None = Header(None),
+):
+    return StreamingResponse(
+        event_stream(request, current_user.referralId, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
@@ -1,16 +1,24 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Form, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Form, BackgroundTasks, Request
 from models.user_models import Token, RegisterUser, EmailOnlyRequest
 from schemas.user_auth import *
+from schemas.rate_limit import enforce_rate_limit, MAX_VERIFY_ATTEMPTS
+from schemas.list_versions import bump_version, USERS_VERSION_KEY
+from config import database
 from config.database import users_collection, verification_collection
+from config.settings import VERIFY_USE_TRANSACTION
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import JWTError
 
 router = APIRouter()
 
 
+
 @router.post("/register")
-async def start_registration(request: RegisterUser, background_tasks: BackgroundTasks):
+async def start_registration(request: RegisterUser, background_tasks: BackgroundTasks, http_request: Request):
+    await enforce_rate_limit("register", http_request, request.email)
     try:
         request.email = request.email.lower()
 
@@ -28,7 +36,7 @@ async def start_registration(request: RegisterUser, background_tasks: Background
             "_id": request.email,
             "name": request.name,
             "contactnumber": request.contactnumber,
-            "password": hash_password(request.password),
+            "password": await hash_password(request.password),
             "code": verification_code,
             "role": "user",
             "expires_at": datetime.utcnow() + timedelta(minutes=5)
@@ -45,7 +53,8 @@ async def start_registration(request: RegisterUser, background_tasks: Background
     
 
 @router.post("/resend-code")
-async def resend_code(request: EmailOnlyRequest, background_tasks: BackgroundTasks):
+async def resend_code(request: EmailOnlyRequest, background_tasks: BackgroundTasks, http_request: Request):
+    await enforce_rate_limit("resend-code", http_request, request.email)
     try:
         request.email = request.email.lower()
 
@@ -62,6 +71,7 @@ async def resend_code(request: EmailOnlyRequest, background_tasks: BackgroundTas
             {
                 "$set": {
                     "code": new_code,
+                    "failed_attempts": 0,
                     "expires_at": datetime.utcnow() + timedelta(minutes=5)
                 }
             }
@@ -76,38 +86,79 @@ async def resend_code(request: EmailOnlyRequest, background_tasks: BackgroundTas
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+async def reject_verification(email: str):
+    # Only reached when the atomic consume didn't match; one round trip both
+    # records the failed attempt and tells us why it failed
+    verification = await verification_collection.find_one_and_update(
+        {"_id": email},
+        {"$inc": {"failed_attempts": 1}},
+        projection={"expires_at": 1, "failed_attempts": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if verification and verification["failed_attempts"] > MAX_VERIFY_ATTEMPTS:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many incorrect codes. Please request a new one.",
+        )
+    if verification and verification["expires_at"] < datetime.utcnow():
+        raise HTTPException(status_code=400, detail="Verification code has expired. Please request a new one.")
+    raise HTTPException(status_code=400, detail="Invalid or expired verification code.")
+
+
+async def consume_verification(email: str, code: str, session=None):
+    # Checking the code in the filter makes the check-and-delete atomic, so
+    # of two concurrent submits only one ever sees the record
+    verification = await verification_collection.find_one_and_delete(
+        {
+            "_id": email,
+            "code": code,
+            "expires_at": {"$gte": datetime.utcnow()},
+            "failed_attempts": {"$not": {"$gte": MAX_VERIFY_ATTEMPTS}},
+        },
+        session=session,
+    )
+    if not verification:
+        return None
+
+    user_data = {
+        "_id": str(uuid.uuid4()),
+        "name": verification["name"],
+        "email": email,
+        "contactnumber": verification["contactnumber"],
+        "password": verification["password"],
+        "role": verification["role"],
+        "created_at": datetime.utcnow(),
+    }
+    try:
+        await insert_user_with_referral_id(user_data, verification["name"] or "XX", session=session)
+    except DuplicateKeyError:
+        # The unique email index: this address was registered meanwhile
+        raise HTTPException(status_code=400, detail="Email already exists.")
+    return verification
+
+
 @router.post("/verify-code", response_model=Token)  
-async def verify_code(email: str = Form(...), code: str = Form(...)):
+async def verify_code(http_request: Request, email: str = Form(...), code: str = Form(...)):
+    await enforce_rate_limit("verify-code", http_request, email)
     try:
         email = email.lower()
-        verification = await verification_collection.find_one({"_id": email})
-
-        if not verification or verification["code"] != code:
-            raise HTTPException(status_code=400, detail="Invalid or expired verification code.")
-        
-        # Check if code is expired
-        if verification["expires_at"] < datetime.utcnow():
-            raise HTTPException(status_code=400, detail="Verification code has expired. Please request a new one.")
-
-        # Generate referral ID
-        referral_id = await generate_unique_referral_id(verification["name"] or "XX")
-
-        user_data = {
-            "_id": str(uuid.uuid4()),
-            "name": verification["name"],
-            "email": email,
-            "contactnumber": verification["contactnumber"],
-            "referralId": referral_id,
-            "password": verification["password"],
-            "role": verification["role"],
-            "created_at": datetime.utcnow(),
-        }
-
-        await users_collection.insert_one(user_data)
-        await verification_collection.delete_one({"_id": email})
+
+        if VERIFY_USE_TRANSACTION:
+            # Needs a replica set; a failed insert then also restores the code
+            async with await database.get_db().client.start_session() as session:
+                async with session.start_transaction():
+                    verification = await consume_verification(email, code, session=session)
+        else:
+            verification = await consume_verification(email, code)
+
+        if not verification:
+            await reject_verification(email)
+
+        invalidate_user(email)
+        await bump_version(USERS_VERSION_KEY)
 
         # Generate tokens
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_SECONDS)
+        access_token_expires = timedelta(seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
         refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
         access_token = create_access_token(
@@ -120,6 +171,8 @@ async def verify_code(email: str = Form(...), code: str = Form(...)):
 
         return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer", expires_in=ACCESS_TOKEN_EXPIRE_SECONDS, role=verification["role"])
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
@@ -127,7 +180,9 @@ async def verify_code(email: str = Form(...), code: str = Form(...)):
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    http_request: Request,
 ) -> Token:
+    await enforce_rate_limit("token", http_request, form_data.username)
     user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -158,22 +213,22 @@ async def refresh_access_token(refresh_token: str):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
         # Check if the user exists
-        user = await users_collection.find_one({"email": email})
+        user = await get_principal(email)
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
         # Generate new access and refresh tokens
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_SECONDS)
+        access_token_expires = timedelta(seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
         refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
         access_token = create_access_token(
-            data={"sub": email, "role": user["role"]}, expires_delta=access_token_expires
+            data={"sub": email, "role": user.role}, expires_delta=access_token_expires
         )
         refresh_token = create_refresh_token(
-            data={"sub": email, "role": user["role"]}, expires_delta=refresh_token_expires
+            data={"sub": email, "role": user.role}, expires_delta=refresh_token_expires
         )
 
-        return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer", expires_in=ACCESS_TOKEN_EXPIRE_SECONDS, role=user["role"])
+        return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer", expires_in=ACCESS_TOKEN_EXPIRE_SECONDS, role=user.role)
 
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
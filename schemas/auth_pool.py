@@ -0,0 +1,98 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config.settings import AUTH_POOL_KIND, AUTH_POOL_WORKERS, AUTH_POOL_MAX_QUEUE, BCRYPT_ROUNDS
+
+# Pinning min/max rounds to the configured cost makes needs_update() flag any
+# hash created with a different cost, so it gets rehashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+# Module level so they can be pickled into a process pool
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordWorkerPool:
+    """Runs bcrypt work off the event loop with a bounded wait queue."""
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+        self._waiting = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy. Please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+        self._waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - queued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self._waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_avg": self.wait_seconds_total / self.completed if self.completed else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+auth_pool = PasswordWorkerPool(AUTH_POOL_KIND, AUTH_POOL_WORKERS, AUTH_POOL_MAX_QUEUE)
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from email.utils import format_datetime, parsedate_to_datetime
+
+import aiosmtplib
+from config.database import email_outbox_collection
+from config.metrics import OPERATION_LATENCY
+from config.settings import (
+    SMTP_HOST, SMTP_PORT, SMTP_USE_TLS, SMTP_TIMEOUT_SECONDS, SMTP_IDLE_SECONDS, EMAIL_SENDER, EMAIL_PASSWORD,
+    EMAIL_CONNECTIONS, EMAIL_BATCH_SIZE, EMAIL_MAX_ATTEMPTS, EMAIL_BACKOFF_SECONDS, EMAIL_BACKOFF_MAX_SECONDS,
+    EMAIL_OUTBOX_MAX_AGE_SECONDS,
+)
+
+
+def build_message(to_email: str, subject: str, body: str, queued_at: datetime | None = None) -> MIMEText:
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = EMAIL_SENDER
+    msg["To"] = to_email
+    # When the message was first queued; it survives a trip through the outbox
+    msg["Date"] = format_datetime((queued_at or datetime.utcnow()).replace(tzinfo=timezone.utc), usegmt=True)
+    return msg
+
+
+def queued_at(msg: MIMEText) -> datetime:
+    return parsedate_to_datetime(msg["Date"]).replace(tzinfo=None)
+
+
+class EmailDispatcher:
+    """Sends queued emails over a few long-lived SMTP connections.
+
+    Each worker owns one connection and drains up to ``batch_size`` messages
+    per wake-up. Failed sends are retried with exponential backoff and, once
+    out of attempts, parked in the outbox collection to be replayed on the
+    next start. On stop, everything not yet sent (queued, waiting out a
+    backoff, or in a batch a worker had picked up) goes to the outbox too.
+    """
+
+    def __init__(self, connections: int, batch_size: int, max_attempts: int):
+        self.connections = connections
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._queue = None
+        self._workers = []
+        # Items taken off the queue but not yet sent or handed to _retry
+        self._in_flight = set()
+        # token -> (timer handle, item) for retries waiting out their backoff
+        self._retrying = {}
+        self._stopping = False
+
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.connections)]
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Anything not yet sent goes to the outbox rather than being lost. A
+        # message cut off mid-send may go out twice; that beats never.
+        undelivered = list(self._in_flight)
+        self._in_flight.clear()
+        for handle, item in self._retrying.values():
+            handle.cancel()
+            undelivered.append(item)
+        self._retrying.clear()
+        while not self._queue.empty():
+            undelivered.append(self._queue.get_nowait())
+        for msg, attempts, error in undelivered:
+            await self._store_undelivered(msg, attempts, error or "shutdown")
+
+    async def enqueue(self, msg: MIMEText):
+        self.start()
+        self._queue.put_nowait((msg, 0, None))
+
+    async def replay_outbox(self, limit: int = 1000):
+        """Requeue parked messages, oldest first.
+
+        Messages older than EMAIL_OUTBOX_MAX_AGE_SECONDS are dropped, as are
+        ones that already failed their extra attempt after an earlier replay;
+        the rest keep their attempt count, so a dead address gets one more
+        try per restart rather than a fresh set of retries.
+        """
+        self.start()
+        cutoff = datetime.utcnow() - timedelta(seconds=EMAIL_OUTBOX_MAX_AGE_SECONDS)
+        discarded = await email_outbox_collection.delete_many({"$or": [
+            {"queued_at": {"$lt": cutoff}},
+            {"queued_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+            {"attempts": {"$gt": self.max_attempts}},
+        ]})
+        if discarded.deleted_count:
+            print(f"Discarded {discarded.deleted_count} stale or undeliverable emails from the outbox")
+
+        replayed = 0
+        while replayed < limit:
+            doc = await email_outbox_collection.find_one_and_delete({}, sort=[("created_at", 1)])
+            if not doc:
+                break
+            msg = build_message(doc["to"], doc["subject"], doc["body"], doc.get("queued_at") or doc["created_at"])
+            self._queue.put_nowait((msg, doc.get("attempts", 0), doc.get("last_error")))
+            replayed += 1
+        return replayed
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            use_tls=SMTP_USE_TLS,
+            timeout=SMTP_TIMEOUT_SECONDS,
+        )
+        await smtp.connect()
+        if EMAIL_SENDER and EMAIL_PASSWORD:
+            await smtp.login(EMAIL_SENDER, EMAIL_PASSWORD)
+        return smtp
+
+    async def _close(self, smtp):
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _worker(self):
+        smtp = None
+        try:
+            # wait_for can swallow a cancel that lands as get() returns an
+            # item; the flag still ends the worker once that batch is done
+            while not self._stopping:
+                try:
+                    first = await asyncio.wait_for(self._queue.get(), timeout=SMTP_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Don't hold an idle connection open for the server to drop
+                    await self._close(smtp)
+                    smtp = None
+                    continue
+
+                batch = [first]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                self._in_flight.update(batch)
+
+                for item in batch:
+                    msg, attempts, _ = item
+                    try:
+                        started = time.perf_counter()
+                        if smtp is None or not smtp.is_connected:
+                            smtp = await self._connect()
+                        await smtp.send_message(msg)
+                        OPERATION_LATENCY.labels("smtp_send").observe(time.perf_counter() - started)
+                        self.sent += 1
+                    except Exception as e:
+                        # Drop the connection; the next message reconnects
+                        if smtp is not None:
+                            smtp.close()
+                        smtp = None
+                        await self._retry(msg, attempts + 1, str(e))
+                    self._in_flight.discard(item)
+        finally:
+            await self._close(smtp)
+
+    async def _retry(self, msg: MIMEText, attempts: int, error: str):
+        if attempts >= self.max_attempts:
+            self.failed += 1
+            print(f"Email send failed after {attempts} attempts: {error}")
+            await self._store_undelivered(msg, attempts, error)
+            return
+        delay = min(EMAIL_BACKOFF_SECONDS * 2 ** (attempts - 1), EMAIL_BACKOFF_MAX_SECONDS)
+        token = object()
+        handle = asyncio.get_running_loop().call_later(delay, self._requeue, token)
+        self._retrying[token] = (handle, (msg, attempts, error))
+
+    def _requeue(self, token):
+        _, item = self._retrying.pop(token)
+        self._queue.put_nowait(item)
+
+    async def _store_undelivered(self, msg: MIMEText, attempts: int, error: str):
+        try:
+            await email_outbox_collection.insert_one({
+                "to": msg["To"],
+                "subject": msg["Subject"],
+                "body": msg.get_payload(decode=True).decode(msg.get_content_charset() or "utf-8"),
+                "attempts": attempts,
+                "last_error": error,
+                "queued_at": queued_at(msg),
+                "created_at": datetime.utcnow(),
+            })
+        except Exception as e:
+            print(f"Could not store undelivered email for {msg['To']}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "in_flight": len(self._in_flight),
+            "retrying": len(self._retrying),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+email_dispatcher = EmailDispatcher(EMAIL_CONNECTIONS, EMAIL_BATCH_SIZE, EMAIL_MAX_ATTEMPTS)
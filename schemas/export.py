@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import zlib
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    # datetimes, ObjectIds and anything else Mongo hands back
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+async def _encode(cursor, fields: list[str], fmt: str):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([_csv_value(doc.get(f)) for f in fields])
+        else:
+            buffer.write(json.dumps({f: doc.get(f) for f in fields}, default=_json_default))
+            buffer.write("\n")
+
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def stream_export(cursor, fields: list[str], fmt: str = "ndjson", compress: bool = False):
+    """Encode a Motor cursor as NDJSON or CSV chunks, optionally gzipped.
+
+    Only one batch plus one output chunk is held in memory at a time.
+    """
+    if not compress:
+        async for chunk in _encode(cursor, fields, fmt):
+            yield chunk
+        return
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in _encode(cursor, fields, fmt):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config.database import idempotency_keys_collection
+from config.settings import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_CACHE_SIZE
+from schemas.cache import TTLCache
+
+# How long a request may hold a key before a retry is allowed to take over,
+# so a worker that died mid-request doesn't block the key until it expires
+IDEMPOTENCY_LOCK_SECONDS = 60
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Completed responses only; in-progress claims always go to Mongo
+completed_cache = TTLCache(IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+
+def fingerprint(payload) -> str:
+    return hashlib.blake2b(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+
+def replay(record: dict) -> ORJSONResponse:
+    return ORJSONResponse(record["body"], status_code=record["status_code"], headers={"Idempotent-Replayed": "true"})
+
+
+def check_fingerprint(record: dict, request_hash: str):
+    if record["fingerprint"] != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request body.",
+        )
+
+
+async def claim(key_id: str, request_hash: str) -> dict | None:
+    """Take the key for this request, or return the record of whoever has it."""
+    now = datetime.utcnow()
+    try:
+        await idempotency_keys_collection.insert_one({
+            "_id": key_id,
+            "state": "in_progress",
+            "fingerprint": request_hash,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    # Take over a claim whose owner has gone quiet
+    stale = await idempotency_keys_collection.find_one_and_update(
+        {"_id": key_id, "state": "in_progress", "locked_until": {"$lt": now}, "fingerprint": request_hash},
+        {"$set": {"locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if stale:
+        return None
+    return await idempotency_keys_collection.find_one({"_id": key_id}) or {}
+
+
+async def run_idempotent(idempotency_key: str | None, scope: str, payload, handler):
+    """Run ``handler`` at most once per Idempotency-Key.
+
+    ``scope`` (route and caller) keeps one client's keys from colliding with
+    another's. A repeated key gets the stored response back without running
+    the handler again; only successful responses are stored, so a request
+    that failed can be retried with the same key. ``handler`` must therefore
+    only raise before its write commits; later bookkeeping is best-effort.
+    """
+    if not idempotency_key:
+        return await handler()
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long.")
+
+    key_id = f"{scope}:{idempotency_key}"
+    request_hash = fingerprint(payload)
+
+    cached = completed_cache.get(key_id)
+    if cached:
+        check_fingerprint(cached, request_hash)
+        return replay(cached)
+
+    existing = await claim(key_id, request_hash)
+    if existing is not None:
+        if not existing:
+            # Expired between our insert and read; treat it like a live claim
+            existing = {"state": "in_progress", "fingerprint": request_hash}
+        check_fingerprint(existing, request_hash)
+        if existing["state"] == "completed":
+            completed_cache.set(key_id, existing)
+            return replay(existing)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed.",
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        body = await handler()
+    except BaseException:
+        await idempotency_keys_collection.delete_one({"_id": key_id, "state": "in_progress"})
+        raise
+
+    record = {"fingerprint": request_hash, "status_code": 200, "body": body}
+    await idempotency_keys_collection.update_one(
+        {"_id": key_id}, {"$set": {"state": "completed", **record}, "$unset": {"locked_until": ""}}
+    )
+    completed_cache.set(key_id, {"state": "completed", **record})
+    return body
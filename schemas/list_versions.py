@@ -0,0 +1,33 @@
+import hashlib
+from fastapi import Request, Response, status
+from config.database import list_versions_collection
+
+USERS_VERSION_KEY = "users"
+
+
+def referrals_version_key(referral_id: str) -> str:
+    return f"referrals:{referral_id}"
+
+
+async def bump_version(key: str):
+    # Call after any write that changes what a versioned listing returns
+    await list_versions_collection.update_one({"_id": key}, {"$inc": {"v": 1}}, upsert=True)
+
+
+async def list_etag(key: str, *params) -> str:
+    """ETag for one page of a versioned listing.
+
+    The page depends on the version and on the query (limit, cursor, fields),
+    so both go into the tag.
+    """
+    doc = await list_versions_collection.find_one({"_id": key})
+    version = doc["v"] if doc else 0
+    digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config.database import mortgage_applications_collection
+from models.form_models import MONEY_FIELDS, PERCENTAGE_FIELDS, DATE_FIELDS, parse_number, parse_date, to_bson
+
+LTV_BOUNDARIES = [0, 50, 60, 70, 75, 80, 85, 90, 95, 100, 1000]
+PERCENTILES = [10, 25, 50, 75, 90]
+ANALYTICS_BATCH_SIZE = 5000
+
+
+def _renewal_boundaries(now: datetime) -> tuple[list[datetime], list[str]]:
+    months = [0, 3, 6, 12, 24]
+    bounds = [now + timedelta(days=30 * m) for m in months]
+    labels = ["0-3 months", "3-6 months", "6-12 months", "12-24 months"]
+    return bounds, labels
+
+
+def _amount(field: str) -> dict:
+    return {"$toDouble": {"$ifNull": [f"${field}", 0]}}
+
+
+async def aggregate_portfolio(collection=mortgage_applications_collection) -> dict:
+    """Totals, LTV distribution and renewal buckets in one $facet pass."""
+    # Midnight, so the bounds survive BSON's millisecond dates unchanged and
+    # still match label_for below; renewal dates are whole days anyway
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    bounds, labels = _renewal_boundaries(now)
+    ltv = {"$ifNull": ["$loanToValue1", "$loanToValue2"]}
+    pipeline = [
+        # Only numeric values take part; unmigrated strings are skipped
+        {"$set": {"_ltv": {"$cond": [{"$isNumber": ltv}, {"$toDouble": ltv}, None]}}},
+        {"$facet": {
+            "by_type": [
+                {"$group": {
+                    "_id": {"kind": "$kind", "type": {"$ifNull": ["$mortgageType", "$newMortgageType"]}},
+                    "count": {"$sum": 1},
+                    "mortgage_amount": {"$sum": {"$cond": [{"$isNumber": "$mortgageAmount"}, _amount("mortgageAmount"), 0]}},
+                    "loan_amount": {"$sum": {"$cond": [{"$isNumber": "$loanAmount"}, _amount("loanAmount"), 0]}},
+                    "property_value": {"$sum": {"$cond": [{"$isNumber": "$estPropertyValue"}, _amount("estPropertyValue"), 0]}},
+                    "avg_ltv": {"$avg": "$_ltv"},
+                }},
+                {"$sort": {"count": -1}},
+            ],
+            "ltv_distribution": [
+                {"$match": {"_ltv": {"$ne": None}}},
+                {"$bucket": {"groupBy": "$_ltv", "boundaries": LTV_BOUNDARIES, "default": "unknown", "output": {"count": {"$sum": 1}}}},
+            ],
+            "renewals": [
+                {"$match": {"renewalDate": {"$type": "date"}}},
+                {"$bucket": {
+                    "groupBy": "$renewalDate",
+                    "boundaries": bounds,
+                    "default": "outside window",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "overdue_renewals": [
+                {"$match": {"renewalDate": {"$type": "date", "$lt": now}}},
+                {"$count": "count"},
+            ],
+        }},
+    ]
+    result = (await collection.aggregate(pipeline).to_list(length=1))[0]
+
+    label_for = {bound: label for bound, label in zip(bounds, labels)}
+    return {
+        "by_type": [{**row.pop("_id"), **row} for row in result["by_type"]],
+        "ltv_distribution": [
+            {"from": row["_id"], "count": row["count"]} for row in result["ltv_distribution"]
+        ],
+        "renewals": [
+            {"bucket": label_for.get(row["_id"], row["_id"]), "count": row["count"]}
+            for row in result["renewals"]
+        ],
+        "overdue_renewals": result["overdue_renewals"][0]["count"] if result["overdue_renewals"] else 0,
+    }
+
+
+async def load_numeric_columns(fields: list[str], collection=mortgage_applications_collection) -> dict:
+    # Mongo converts Decimal128 to doubles; we only pull the columns we need
+    pipeline = [{"$project": {
+        "_id": 0,
+        **{f: {"$cond": [{"$isNumber": f"${f}"}, {"$toDouble": f"${f}"}, None]} for f in fields},
+    }}]
+    columns = {f: [] for f in fields}
+    async for doc in collection.aggregate(pipeline, batchSize=ANALYTICS_BATCH_SIZE):
+        for f in fields:
+            columns[f].append(doc.get(f))
+    # NaN for missing values; the stats below ignore them
+    return {f: np.array(values, dtype=np.float64) for f, values in columns.items()}
+
+
+def describe(values: np.ndarray) -> dict:
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return {"count": 0}
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        "count": int(values.size),
+        "sum": float(values.sum()),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        **{f"p{p}": float(v) for p, v in zip(PERCENTILES, percentiles)},
+    }
+
+
+async def portfolio_statistics(collection=mortgage_applications_collection) -> dict:
+    columns = await load_numeric_columns(MONEY_FIELDS + PERCENTAGE_FIELDS, collection)
+    # The numpy work is vectorized but still CPU; keep it off the event loop
+    return await asyncio.to_thread(lambda: {field: describe(values) for field, values in columns.items()})
+
+
+async def backfill_numeric_fields(batch_size: int = 1000) -> dict:
+    """Convert legacy string amounts, LTVs and dates to Decimal128/dates.
+
+    Values that don't parse are left as they are and counted, so they can
+    be fixed by hand.
+    """
+    string_fields = MONEY_FIELDS + PERCENTAGE_FIELDS + DATE_FIELDS
+    query = {"$or": [{f: {"$type": "string"}} for f in string_fields]}
+    converted = unparsed = 0
+    last_id = None
+
+    while True:
+        page_query = {"$and": [query, {"_id": {"$gt": last_id}}]} if last_id else query
+        docs = await mortgage_applications_collection.find(
+            page_query, {f: 1 for f in string_fields}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        updates = []
+        for doc in docs:
+            changes = {}
+            for f in string_fields:
+                if not isinstance(doc.get(f), str):
+                    continue
+                parser = parse_date if f in DATE_FIELDS else parse_number
+                try:
+                    changes[f] = to_bson(parser(doc[f]))
+                except ValueError:
+                    unparsed += 1
+            if changes:
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+
+        if updates:
+            try:
+                result = await mortgage_applications_collection.bulk_write(updates, ordered=False)
+                converted += result.modified_count
+            except BulkWriteError as e:
+                converted += e.details.get("nModified", 0)
+
+    return {"converted": converted, "unparsed_values": unparsed}
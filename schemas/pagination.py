@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ID_ASCENDING = [("_id", 1)]
+# Ids are random uuids, so listings that should read in order go by created_at
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+
+# Stand-in created_at for documents that predate the field, so they still
+# sort and paginate (missing values never match a keyset range)
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1)
+
+
+def _encode_value(value):
+    # Ids are uuid strings, but older documents may still have ObjectIds
+    if isinstance(value, ObjectId):
+        return {"oid": str(value)}
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return {"v": value}
+
+
+def _decode_value(value: dict):
+    if "oid" in value:
+        return ObjectId(value["oid"])
+    if "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value["v"]
+
+
+def encode_cursor(doc: dict, sort: list[tuple[str, int]] = ID_ASCENDING) -> str:
+    values = [_encode_value(doc.get(field)) for field, _ in sort]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: list[tuple[str, int]] = ID_ASCENDING) -> list:
+    try:
+        values = [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(cursor.encode()))]
+    except Exception:
+        values = None
+    if not values or len(values) != len(sort):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return values
+
+
+def keyset_filter(sort: list[tuple[str, int]], values: list) -> dict:
+    # Everything strictly after (v1, v2, ...) in sort order:
+    # f1 > v1, or f1 == v1 and f2 > v2, ...
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        branch[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def created_between(query: dict, created_from: datetime | None, created_to: datetime | None) -> dict:
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
+    return query
+
+
+def build_projection(fields: str | None, allowed: list[str]) -> dict:
+    # Only ever return whitelisted fields; `fields` can narrow them further
+    selected = allowed
+    if fields:
+        requested = {f.strip() for f in fields.split(",")}
+        selected = [f for f in allowed if f in requested]
+    return {f: 1 for f in selected}
+
+
+async def backfill_created_at(collection) -> int:
+    result = await collection.update_many(
+        {"created_at": {"$exists": False}}, {"$set": {"created_at": UNKNOWN_CREATED_AT}}
+    )
+    return result.modified_count
+
+
+async def paginate(
+    collection,
+    query: dict,
+    projection: dict,
+    limit: int,
+    after: str | None = None,
+    sort: list[tuple[str, int]] = ID_ASCENDING,
+):
+    """Keyset-paginate ``collection`` in ``sort`` order (which must end in
+    ``_id`` so it is unique).
+
+    Each page is a single indexed range scan, so it costs the same no matter
+    how deep into the collection it is.
+    """
+    if after:
+        after_filter = keyset_filter(sort, decode_cursor(after, sort))
+        query = {"$and": [query, after_filter]} if query else after_filter
+    if projection:
+        # The cursor is built from the sort fields, so they must come back
+        projection = {**projection, **{field: 1 for field, _ in sort}}
+
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+
+    return {"items": docs, "next_cursor": next_cursor}
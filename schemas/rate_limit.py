@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+from config.database import rate_limits_collection
+from config.settings import RATE_LIMIT_BACKEND, TRUST_FORWARDED_FOR
+from schemas.cache import TTLCache
+
+# rule -> {key kind: (max requests, window seconds)}
+RATE_LIMITS = {
+    "token": {"ip": (20, 60), "email": (5, 60)},
+    "register": {"ip": (10, 60), "email": (3, 600)},
+    "resend-code": {"ip": (10, 60), "email": (3, 600)},
+    "verify-code": {"ip": (30, 60), "email": (10, 600)},
+}
+
+# Wrong codes allowed per verification record before it is locked
+MAX_VERIFY_ATTEMPTS = 5
+
+
+class MemoryTokenBucket:
+    """Per-process token buckets; each key refills at limit/window per second."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self._buckets = TTLCache(maxsize, ttl=24 * 60 * 60)
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        now = time.monotonic()
+        rate = limit / window
+        tokens, updated = self._buckets.get(key, (limit, now))
+        tokens = min(limit, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now), ttl=window)
+            return (1 - tokens) / rate
+        self._buckets.set(key, (tokens - 1, now), ttl=window)
+        return 0
+
+
+class MongoSlidingWindow:
+    """Shared sliding-window counter built from two fixed windows.
+
+    The previous window's count is weighted by how much of it still overlaps
+    the sliding window, which is accurate enough without storing every hit.
+    """
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        now = time.time()
+        current_start = int(now // window) * window
+        current = await rate_limits_collection.find_one_and_update(
+            {"_id": f"{key}:{current_start}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(seconds=2 * window)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        previous = await rate_limits_collection.find_one({"_id": f"{key}:{current_start - window}"})
+
+        overlap = 1 - (now - current_start) / window
+        estimated = current["count"] + (previous["count"] if previous else 0) * overlap
+        if estimated > limit:
+            return current_start + window - now
+        return 0
+
+
+rate_limiter = MongoSlidingWindow() if RATE_LIMIT_BACKEND == "mongo" else MemoryTokenBucket()
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR and request.headers.get("x-forwarded-for"):
+        return request.headers["x-forwarded-for"].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def enforce_rate_limit(rule: str, request: Request, email: str | None = None):
+    """Raise a 429 when the caller's IP or email is over the limit for ``rule``.
+
+    Call this first in a handler so throttled requests never reach bcrypt,
+    SMTP or the database.
+    """
+    keys = {"ip": client_ip(request)}
+    if email:
+        keys["email"] = email.lower()
+
+    for kind, value in keys.items():
+        limit, window = RATE_LIMITS[rule][kind]
+        retry_after = await rate_limiter.hit(f"{rule}:{kind}:{value}", limit, window)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+            )
@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import json
+from collections import deque
+from datetime import datetime
+
+from pymongo.errors import OperationFailure, PyMongoError
+from config.database import get_db, referrals_collection
+from config.settings import REFERRAL_FEED_BACKEND, REFERRAL_FEED_HEARTBEAT_SECONDS
+
+REFERRAL_FEED_REPLAY_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# ChangeStreamHistoryLost, InvalidResumeToken, ChangeStreamFatalError: the
+# saved position is gone from the oplog, so resuming from it can never work
+NON_RESUMABLE_CODES = {286, 260, 280}
+
+STATUS_CHANGES = [{"$match": {
+    "operationType": "update",
+    "updateDescription.updatedFields.status": {"$exists": True},
+}}]
+
+
+class ReferralFeed:
+    """Fans referral status changes out to per-introducer subscribers.
+
+    One change stream (or the in-process publish calls) feeds every
+    connection; a subscriber is just a small queue. Recent events are kept
+    in a ring buffer so reconnecting clients can resume from Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self._subscribers = {}
+        self._recent = deque(maxlen=REFERRAL_FEED_REPLAY_SIZE)
+        self._sequence = itertools.count(1)
+        self._resume_token = None
+        self._start_at = None
+        self._watcher = None
+
+    async def start(self):
+        if self.mode:
+            return
+        if REFERRAL_FEED_BACKEND in ("auto", "changestream"):
+            try:
+                # Only replica sets and sharded clusters have an oplog to watch
+                hello = await get_db().command("hello")
+                if hello.get("setName") or hello.get("msg") == "isdbgrid":
+                    # The watcher starts here, so nothing written after startup is missed
+                    self._start_at = hello.get("operationTime")
+                    self.mode = "changestream"
+                    self._watcher = asyncio.create_task(self._watch())
+                    return
+                reason = "standalone mongod"
+            except PyMongoError as e:
+                reason = e
+            if REFERRAL_FEED_BACKEND == "changestream":
+                raise RuntimeError(f"Change streams unavailable: {reason}")
+            print(f"Change streams unavailable, using in-process referral feed: {reason}")
+        self.mode = "memory"
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        self.mode = None
+
+    async def _watch(self):
+        while True:
+            try:
+                async with referrals_collection.watch(
+                    STATUS_CHANGES,
+                    full_document="updateLookup",
+                    resume_after=self._resume_token,
+                    start_at_operation_time=None if self._resume_token else self._start_at,
+                ) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        doc = change.get("fullDocument") or {}
+                        if doc.get("referralId"):
+                            self._dispatch(
+                                change["_id"]["_data"],
+                                doc["referralId"],
+                                {"id": doc["_id"], "status": doc.get("status"), "updated_at": datetime.utcnow().isoformat()},
+                            )
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in NON_RESUMABLE_CODES or e.has_error_label("NonResumableChangeStreamError"):
+                    # Start over from now; clients fall back to their Last-Event-ID replay
+                    print(f"Referral change stream position lost, restarting from now: {e}")
+                    self._resume_token = self._start_at = None
+                else:
+                    print(f"Referral change stream interrupted, resuming: {e}")
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                # Resume from the last token we saw, after a short pause
+                print(f"Referral change stream interrupted, resuming: {e}")
+                await asyncio.sleep(1)
+
+    def publish(self, owner_referral_id: str, referral_id: str, status: str):
+        """Report a status change made by this process.
+
+        A no-op when a change stream is running, since that already sees
+        every write, including those from other workers.
+        """
+        if self.mode == "changestream":
+            return
+        self._dispatch(
+            str(next(self._sequence)),
+            owner_referral_id,
+            {"id": referral_id, "status": status, "updated_at": datetime.utcnow().isoformat()},
+        )
+
+    def _dispatch(self, event_id: str, owner_referral_id: str, payload: dict):
+        event = (event_id, owner_referral_id, payload)
+        self._recent.append(event)
+        for queue in self._subscribers.get(owner_referral_id, ()):
+            if queue.full():
+                # A slow client loses its oldest event rather than growing without bound
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscribe(self, owner_referral_id: str, last_event_id: str | None = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if last_event_id:
+            # Replay what this client missed, if it is still in the buffer
+            ids = [event[0] for event in self._recent]
+            if last_event_id in ids:
+                missed = list(self._recent)[ids.index(last_event_id) + 1:]
+                for event in [e for e in missed if e[1] == owner_referral_id][-SUBSCRIBER_QUEUE_SIZE:]:
+                    queue.put_nowait(event)
+        self._subscribers.setdefault(owner_referral_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, owner_referral_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(owner_referral_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[owner_referral_id]
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+        }
+
+
+async def event_stream(request, owner_referral_id: str, last_event_id: str | None = None):
+    queue = referral_feed.subscribe(owner_referral_id, last_event_id)
+    try:
+        yield f"retry: 5000\n: connected ({referral_feed.mode})\n\n"
+        while not await request.is_disconnected():
+            try:
+                event_id, _, payload = await asyncio.wait_for(queue.get(), timeout=REFERRAL_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": heartbeat\n\n"
+                continue
+            yield f"id: {event_id}\nevent: status\ndata: {json.dumps(payload, default=str)}\n\n"
+    finally:
+        referral_feed.unsubscribe(owner_referral_id, queue)
+
+
+referral_feed = ReferralFeed()
@@ -0,0 +1,48 @@
+import re
+from datetime import datetime
+from config.database import referrals_collection
+from schemas.pagination import created_between, NEWEST_FIRST, UNKNOWN_CREATED_AT
+
+# Lowercased copies of the searchable fields, so an anchored prefix regex
+# can use a plain ascending index
+SEARCH_FIELDS = {"firstName": "firstName_lc", "lastName": "lastName_lc", "referralEmail": "referralEmail_lc"}
+
+SORTS = {
+    "newest": NEWEST_FIRST,
+    "oldest": [("created_at", 1), ("_id", 1)],
+}
+
+
+def search_fields(referral_data: dict) -> dict:
+    return {lc: (referral_data.get(field) or "").lower() for field, lc in SEARCH_FIELDS.items()}
+
+
+def build_referral_search(
+    status: str | None = None,
+    purpose: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    q: str | None = None,
+) -> dict:
+    query = {}
+    if status:
+        query["status"] = status
+    if purpose:
+        query["purpose"] = purpose
+    created_between(query, created_from, created_to)
+    if q:
+        prefix = {"$regex": f"^{re.escape(q.strip().lower())}"}
+        query["$or"] = [{lc: prefix} for lc in SEARCH_FIELDS.values()]
+    return query
+
+
+async def backfill_referral_search_fields() -> int:
+    # One server-side pipeline update, no documents pulled into Python
+    result = await referrals_collection.update_many(
+        {"$or": [{"firstName_lc": {"$exists": False}}, {"created_at": {"$exists": False}}]},
+        [{"$set": {
+            **{lc: {"$toLower": {"$ifNull": [f"${field}", ""]}} for field, lc in SEARCH_FIELDS.items()},
+            "created_at": {"$ifNull": ["$created_at", UNKNOWN_CREATED_AT]},
+        }}],
+    )
+    return result.modified_count
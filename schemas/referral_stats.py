@@ -0,0 +1,69 @@
+from collections import Counter
+from pymongo import UpdateOne
+from config.database import referrals_collection, referral_stats_collection
+
+
+def _stat_key(referral_id: str, status: str, purpose: str) -> dict:
+    # Field order matters for subdocument equality, keep it fixed
+    return {"_id": {"referralId": referral_id, "status": status, "purpose": purpose}}
+
+
+async def record_referral_created(referral_id: str, status: str, purpose: str, count: int = 1):
+    await referral_stats_collection.update_one(
+        _stat_key(referral_id, status, purpose), {"$inc": {"count": count}}, upsert=True
+    )
+
+
+async def record_referrals_created(referral_id: str, status: str, counts_by_purpose: dict[str, int]):
+    await referral_stats_collection.bulk_write([
+        UpdateOne(_stat_key(referral_id, status, purpose), {"$inc": {"count": count}}, upsert=True)
+        for purpose, count in counts_by_purpose.items()
+    ], ordered=False)
+
+
+async def record_status_change(referral_id: str, purpose: str, old_status: str, new_status: str):
+    await record_status_changes([(referral_id, purpose, old_status, new_status)])
+
+
+async def record_status_changes(changes: list[tuple[str, str, str, str]]):
+    """Apply (referralId, purpose, old status, new status) moves in one bulk_write."""
+    deltas = Counter()
+    for referral_id, purpose, old_status, new_status in changes:
+        deltas[(referral_id, old_status, purpose)] -= 1
+        deltas[(referral_id, new_status, purpose)] += 1
+    operations = [
+        UpdateOne(_stat_key(*key), {"$inc": {"count": delta}}, upsert=True)
+        for key, delta in deltas.items() if delta
+    ]
+    if operations:
+        await referral_stats_collection.bulk_write(operations, ordered=False)
+
+
+async def get_referral_stats(referral_id: str | None = None) -> list[dict]:
+    """Summarise the counters per introducer without touching referrals."""
+    query = {"_id.referralId": referral_id} if referral_id else {}
+    summary = {}
+    async for doc in referral_stats_collection.find(query):
+        key = doc["_id"]
+        if not doc["count"]:
+            continue
+        stats = summary.setdefault(key["referralId"], {
+            "referralId": key["referralId"], "total": 0, "by_status": {}, "by_purpose": {},
+        })
+        stats["total"] += doc["count"]
+        stats["by_status"][key["status"]] = stats["by_status"].get(key["status"], 0) + doc["count"]
+        stats["by_purpose"][key["purpose"]] = stats["by_purpose"].get(key["purpose"], 0) + doc["count"]
+    return list(summary.values())
+
+
+async def rebuild_referral_stats():
+    # $out swaps the collection in atomically once the aggregation finishes
+    pipeline = [
+        {"$group": {
+            "_id": {"referralId": "$referralId", "status": "$status", "purpose": "$purpose"},
+            "count": {"$sum": 1},
+        }},
+        {"$out": referral_stats_collection.name},
+    ]
+    await referrals_collection.aggregate(pipeline).to_list(length=None)
+    return await referral_stats_collection.count_documents({})
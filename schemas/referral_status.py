@@ -0,0 +1,119 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config.database import referrals_collection, referral_events_collection
+from models.referral_models import StatusChange
+from schemas.referral_stats import record_status_changes
+from schemas.list_versions import bump_version, referrals_version_key
+from schemas.referral_feed import referral_feed
+
+MAX_BULK_STATUS_CHANGES = 1000
+
+PRE_IMAGE_PROJECTION = {"referralId": 1, "status": 1, "purpose": 1}
+
+
+def status_update(new_status: str, event_id: ObjectId) -> dict:
+    # last_event_id lets a bulk caller tell which of its conditional updates landed
+    return {"$set": {"status": new_status, "status_updated_at": datetime.utcnow(), "last_event_id": event_id}}
+
+
+async def record_transitions(transitions: list[tuple[ObjectId, dict, str]], changed_by: str):
+    """Bookkeeping for (event id, pre-image, new status) moves that were applied:
+    list versions, the audit trail, the stats counters and the live feed."""
+    # List versions first, so a failure below can't leave pollers on a stale 304
+    for owner in {previous["referralId"] for _, previous, _ in transitions}:
+        await bump_version(referrals_version_key(owner))
+
+    now = datetime.utcnow()
+    await referral_events_collection.insert_many([{
+        "_id": event_id,
+        "referral": previous["_id"],
+        "referralId": previous["referralId"],
+        "from": previous.get("status"),
+        "to": new_status,
+        "changed_by": changed_by,
+        "at": now,
+    } for event_id, previous, new_status in transitions], ordered=False)
+
+    await record_status_changes([
+        (previous["referralId"], previous.get("purpose"), previous.get("status"), new_status)
+        for _, previous, new_status in transitions
+    ])
+    for _, previous, new_status in transitions:
+        referral_feed.publish(previous["referralId"], previous["_id"], new_status)
+
+
+async def apply_status_changes(changes: list[StatusChange], changed_by: str) -> list[dict]:
+    """Apply many status changes in one bulk_write and report on each.
+
+    Every update is conditional on the status read just before it (and on
+    ``expected_status`` when given), so a referral changed by someone else
+    in the meantime comes back as a conflict instead of being overwritten.
+    """
+    results = [None] * len(changes)
+    ids = list(dict.fromkeys(change.id for change in changes))
+    current = {
+        doc["_id"]: doc
+        async for doc in referrals_collection.find({"_id": {"$in": ids}}, PRE_IMAGE_PROJECTION)
+    }
+
+    seen, pending = set(), []
+    for index, change in enumerate(changes):
+        result = {"index": index, "id": change.id}
+        previous = current.get(change.id)
+        if change.id in seen:
+            results[index] = {**result, "status": "error", "error": "Referral appears more than once in this request"}
+            continue
+        seen.add(change.id)
+        if previous is None:
+            results[index] = {**result, "status": "not_found"}
+        elif change.expected_status is not None and previous.get("status") != change.expected_status:
+            results[index] = {**result, "status": "conflict", "current_status": previous.get("status")}
+        elif previous.get("status") == change.status:
+            results[index] = {**result, "status": "unchanged"}
+        else:
+            pending.append((index, ObjectId(), previous, change.status))
+
+    if not pending:
+        return results
+
+    operations = [
+        UpdateOne({"_id": previous["_id"], "status": previous.get("status")}, status_update(new_status, event_id))
+        for _, event_id, previous, new_status in pending
+    ]
+    failed = {}
+    try:
+        outcome = await referrals_collection.bulk_write(operations, ordered=False)
+        modified = outcome.modified_count
+    except BulkWriteError as e:
+        failed = {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+        modified = e.details.get("nModified", 0)
+
+    event_ids = [event_id for _, event_id, _, _ in pending]
+    if modified == len(pending):
+        applied = set(event_ids)
+    else:
+        # Some filters no longer matched; the event ids show which writes landed
+        applied = {
+            doc["last_event_id"]
+            async for doc in referrals_collection.find(
+                {"_id": {"$in": [previous["_id"] for _, _, previous, _ in pending]}, "last_event_id": {"$in": event_ids}},
+                {"last_event_id": 1},
+            )
+        }
+
+    transitions = []
+    for position, (index, event_id, previous, new_status) in enumerate(pending):
+        result = {"index": index, "id": previous["_id"]}
+        if event_id in applied:
+            results[index] = {**result, "status": "updated", "previous_status": previous.get("status")}
+            transitions.append((event_id, previous, new_status))
+        elif position in failed:
+            results[index] = {**result, "status": "error", "error": failed[position]}
+        else:
+            results[index] = {**result, "status": "conflict"}
+
+    if transitions:
+        await record_transitions(transitions, changed_by)
+    return results
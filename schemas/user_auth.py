@@ -4,34 +4,58 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from models.user_models import UserInDB, TokenData
-from config.database import users_collection, SECRET_KEY, ALGORITHM
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from models.user_models import User, UserInDB, TokenData
+from config.database import users_collection, referral_counters_collection
+from config.settings import (
+    SECRET_KEY, ALGORITHM, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS, REFERRAL_ID_BLOCK_SIZE,
+)
+from config.metrics import timed
+from schemas.auth_pool import auth_pool, _hash, _verify_and_update
+from schemas.cache import TTLCache
+from schemas.email_dispatcher import email_dispatcher, build_message
 import jwt
 import random
-import string
-import smtplib
-from email.mime.text import MIMEText
-from dotenv import find_dotenv, load_dotenv
-import os
+import re
+import time
 
-dotenv_path = find_dotenv()
-load_dotenv(dotenv_path)
 
 
 ACCESS_TOKEN_EXPIRE_SECONDS = 3600
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+REFERRAL_SUFFIX_DIGITS = 4
+REFERRAL_ID_MAX_ATTEMPTS = 50
+# Highest suffix the old random allocator could issue
+LEGACY_REFERRAL_SEQ_MAX = 10 ** REFERRAL_SUFFIX_DIGITS - 1
+
+# Only the fields needed to build a User, never the password or mortgage arrays
+PRINCIPAL_PROJECTION = {"name": 1, "email": 1, "contactnumber": 1, "referralId": 1, "role": 1}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# token -> decoded claims, and email -> lean User
+token_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+# prefix -> [next counter value, end of reserved block)
+referral_id_blocks = {}
+
+
+@timed("hash_password")
+async def hash_password(password: str) -> str:
+    return await auth_pool.run(_hash, password)
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def verify_password(plain_password, hashed_password):
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+@timed("verify_password")
+async def verify_and_update_password(plain_password, hashed_password):
+    # Returns (valid, new_hash); new_hash is set when the stored hash is outdated
+    return await auth_pool.run(_verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -51,7 +75,9 @@ def create_refresh_token(data: dict, expires_delta: timedelta):
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_user(email: str):
-    user_dict = await users_collection.find_one({"email": email})
+    user_dict = await users_collection.find_one(
+        {"email": email}, {"mortgage_details": 0, "new_mortgage_requests": 0}
+    )
     if user_dict:
         # Map database field 'password' to 'hashed_password'
         user_dict["hashed_password"] = user_dict.pop("password", None)
@@ -59,12 +85,42 @@ async def get_user(email: str):
         return UserInDB(**user_dict)
     return None
 
+async def get_principal(email: str):
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+    user_dict = await users_collection.find_one({"email": email}, PRINCIPAL_PROJECTION)
+    if not user_dict:
+        return None
+    user_dict["userId"] = user_dict.pop("_id", None)
+    user = User(**user_dict)
+    principal_cache.set(email, user)
+    return user
+
+def invalidate_user(email: str):
+    # Call after any write that changes a user's profile, role or referral ID
+    principal_cache.pop(email)
+
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Never keep claims around longer than the token itself is valid
+    token_cache.set(token, payload, ttl=payload.get("exp", 0) - time.time())
+    return payload
+
 async def authenticate_user(email: str, password: str):
     user = await get_user(email)
     if not user:
         return False	
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Transparently upgrade hashes created with an old cost factor
+        await users_collection.update_one({"_id": user.userId}, {"$set": {"password": new_hash}})
+        user.hashed_password = new_hash
     return user
 
 
@@ -76,7 +132,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         if payload.get("scope") != "access":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -91,7 +147,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     except InvalidTokenError:
         raise credentials_exception
     
-    user = await get_user(email=token_data.email)
+    user = await get_principal(email=token_data.email)
 
     if user is None:
         raise credentials_exception
@@ -99,35 +155,105 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     return user
 
 
+def referral_prefix(name: str) -> str:
+    initials = ''.join([part[0].upper() for part in name.split() if part]) if name else ''
+    return initials or 'XX'
+
+
 async def generate_unique_referral_id(name: str) -> str:
-    while True:
-        initials = ''.join([part[0].upper() for part in name.split() if part]) if name else 'XX'
-        random_suffix = ''.join(random.choices(string.digits, k=4))
-        referral_id = f"{initials}{random_suffix}"
-        
-        existing_user = await users_collection.find_one({"referralId": referral_id})
-        if not existing_user:
-            return referral_id
-        
+    # At most one atomic round trip per block of IDs, however full the prefix is
+    prefix = referral_prefix(name)
+    block = referral_id_blocks.get(prefix)
+    if not block or block[0] >= block[1]:
+        last = await reserve_referral_seq(prefix, REFERRAL_ID_BLOCK_SIZE)
+        block = referral_id_blocks[prefix] = [last - REFERRAL_ID_BLOCK_SIZE + 1, last + 1]
+    seq = block[0]
+    block[0] += 1
+    return format_referral_id(prefix, seq)
 
-async def send_verification_email(to_email: str, code: str):
-    sender_email = os.getenv("email_address")
-    sender_password = os.getenv("email_password")
-    subject = "Verify your email"
-    body = f"Your verification code is: {code}"
 
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = to_email
+def format_referral_id(prefix: str, seq: int) -> str:
+    # Four digits until the prefix has used them all, then just keep growing
+    return f"{prefix}{seq:0{REFERRAL_SUFFIX_DIGITS}d}"
 
-    # Hostinger SMTP config
-    smtp_server = "smtp.hostinger.com"
-    smtp_port = 465
 
+async def seed_referral_counter(prefix: str):
+    """Create the counter for a prefix the first time it is used.
+
+    The old random allocator issued the prefix plus four random digits,
+    spread over the whole range, so a prefix that has any of those starts
+    past it instead of stepping through collisions one insert at a time.
+    """
+    legacy = await users_collection.find_one(
+        {"role": "user", "referralId": {"$regex": f"^{re.escape(prefix)}[0-9]{{{REFERRAL_SUFFIX_DIGITS}}}$"}},
+        {"_id": 1},
+    )
     try:
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-    except Exception as e:
-        print(f"Email send failed: {e}")
\ No newline at end of file
+        await referral_counters_collection.insert_one({"_id": prefix, "seq": LEGACY_REFERRAL_SEQ_MAX if legacy else 0})
+    except DuplicateKeyError:
+        # Another worker seeded it first
+        pass
+
+
+async def reserve_referral_seq(prefix: str, count: int) -> int:
+    """Reserve ``count`` sequence numbers for a prefix; returns the last one."""
+    for _ in range(2):
+        counter = await referral_counters_collection.find_one_and_update(
+            {"_id": prefix}, {"$inc": {"seq": count}}, return_document=ReturnDocument.AFTER
+        )
+        if counter:
+            return counter["seq"]
+        await seed_referral_counter(prefix)
+    raise RuntimeError(f"Could not create the referral counter for {prefix}.")
+
+
+async def backfill_referral_counters() -> int:
+    """Move every prefix that has four-digit IDs past the legacy range.
+
+    For counters created before seed_referral_counter existed. $max only
+    ever moves a counter forward, so this is safe to run more than once.
+    """
+    suffix_start = {"$subtract": [{"$strLenCP": "$referralId"}, REFERRAL_SUFFIX_DIGITS]}
+    pipeline = [
+        {"$match": {"role": "user", "referralId": {"$regex": f"[^0-9][0-9]{{{REFERRAL_SUFFIX_DIGITS}}}$"}}},
+        {"$group": {"_id": {"$substrCP": ["$referralId", 0, suffix_start]}}},
+    ]
+    prefixes = [doc["_id"] async for doc in users_collection.aggregate(pipeline)]
+    if prefixes:
+        await referral_counters_collection.bulk_write([
+            UpdateOne({"_id": prefix}, {"$max": {"seq": LEGACY_REFERRAL_SEQ_MAX}}, upsert=True)
+            for prefix in prefixes
+        ], ordered=False)
+    return len(prefixes)
+
+
+async def allocate_referral_ids(prefix: str, count: int) -> list[str]:
+    """Reserve ``count`` consecutive IDs for a prefix in one round trip, for bulk imports."""
+    last = await reserve_referral_seq(prefix, count)
+    return [format_referral_id(prefix, seq) for seq in range(last - count + 1, last + 1)]
+
+
+async def insert_user_with_referral_id(user_data: dict, name: str, session=None):
+    """Insert a new user, allocating a referral ID.
+
+    Counters start past the old random allocator's IDs (see
+    seed_referral_counter), so a clash is rare; the unique index on
+    referralId is the final guard and we just take the next one.
+    Inside a transaction a duplicate key aborts the whole transaction, so
+    there is only one attempt.
+    """
+    for _ in range(1 if session else REFERRAL_ID_MAX_ATTEMPTS):
+        user_data["referralId"] = await generate_unique_referral_id(name)
+        try:
+            await users_collection.insert_one(user_data, session=session)
+            return user_data["referralId"]
+        except DuplicateKeyError as e:
+            if "referralId" not in (e.details or {}).get("keyPattern", {}):
+                raise
+    raise RuntimeError("Could not allocate a unique referral ID.")
+        
+
+async def send_verification_email(to_email: str, code: str):
+    subject = "Verify your email"
+    body = f"Your verification code is: {code}"
+    await email_dispatcher.enqueue(build_message(to_email, subject, body))
\ No newline at end of file
@@ -0,0 +1,11 @@
+# seed_referral_counters.py
+import asyncio
+from schemas.user_auth import backfill_referral_counters
+
+async def main():
+    print("🔢 Moving referral counters past IDs issued by the old random allocator...")
+    count = await backfill_referral_counters()
+    print(f"✅ Checked {count} referral ID prefixes.")
+
+if __name__ == "__main__":
+    asyncio.run(main())